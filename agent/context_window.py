@@ -0,0 +1,204 @@
+"""
+Janela de contexto com orçamento de tokens para o loop do agente.
+Conta os tokens localmente (tiktoken; sem ele, estimativa de ~4 caracteres por token)
+e, quando o prompt passa do orçamento, compacta resultados antigos de tools e descarta
+o histórico mais antigo — sem separar uma chamada de tool das suas respostas.
+"""
+import json
+
+from core.config import settings
+from core.logger import logger
+
+# Aproximação: o tokenizer do Grok não é público; o o200k_base fica próximo
+_ENCODING_NAME = "o200k_base"
+# Overhead por mensagem (papel, separadores) no formato de chat
+_TOKENS_PER_MESSAGE = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Carrega o tokenizer uma vez; None se o tiktoken não estiver disponível."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(_ENCODING_NAME)
+        except Exception as e:
+            logger.warning(f"tiktoken indisponível ({e}). Contando tokens por estimativa (caracteres / 4).")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: dict) -> int:
+    tokens = _TOKENS_PER_MESSAGE + count_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", ""))
+    return tokens
+
+
+def compact_tool_result(content: str, max_chars: int) -> str:
+    """
+    Reduz um resultado de tool a no máximo max_chars.
+    Listas de produtos viram linhas [produto, unidade, preço] (mantendo os primeiros);
+    o resto é cortado com um aviso.
+    """
+    if len(content) <= max_chars:
+        return content
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict) and isinstance(data.get("produtos"), list):
+        produtos = data["produtos"]
+        compact = {k: v for k, v in data.items() if k != "produtos"}
+        compact["colunas"] = ["produto", "unidade", "preco"]
+        for keep in range(len(produtos), 0, -1):
+            compact["produtos"] = [
+                [p.get("produto"), p.get("unidade"), p.get("preco")] for p in produtos[:keep]
+            ]
+            compact["omitidos"] = len(produtos) - keep
+            text = json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+            if len(text) <= max_chars:
+                return text
+
+    return content[:max_chars] + " …[resultado truncado]"
+
+
+class ContextWindow:
+    """Mantém as mensagens de cada chamada ao LLM dentro do orçamento de tokens."""
+
+    def __init__(self, max_tokens: int, tool_result_max_chars: int):
+        self.max_tokens = max_tokens
+        self.tool_result_max_chars = tool_result_max_chars
+        self._tools_key: int | None = None
+        self._tools_tokens = 0
+        self.calls = 0
+        self.over_budget = 0
+        self.compacted_results = 0
+        self.dropped_messages = 0
+        self._total_tokens = 0
+        self._max_seen_tokens = 0
+
+    def _count_tools(self, tools: list[dict] | None) -> int:
+        """Tokens da definição das tools (calculado uma vez por lista)."""
+        if not tools:
+            return 0
+        if id(tools) != self._tools_key:
+            self._tools_key = id(tools)
+            self._tools_tokens = count_tokens(json.dumps(tools, ensure_ascii=False))
+        return self._tools_tokens
+
+    def fit(self, messages: list[dict], tools: list[dict] | None = None) -> list[dict]:
+        """
+        Retorna as mensagens a enviar, dentro do orçamento. A lista original não é alterada.
+        Ordem de corte: (1) resultados de tools já lidos pelo modelo são compactados;
+        (2) o histórico mais antigo é descartado. O prompt de sistema, o contexto do turno
+        e a última mensagem do cliente nunca saem.
+        """
+        fixed_tokens = self._count_tools(tools)
+        sizes = [count_message_tokens(m) for m in messages]
+        total = fixed_tokens + sum(sizes)
+        original_total = total
+        fitted = messages
+
+        if total > self.max_tokens:
+            self.over_budget += 1
+            fitted = list(messages)
+
+            # 1. Compacta resultados de tools anteriores à última rodada de tool calls
+            last_round = max(
+                (i for i, m in enumerate(fitted) if m.get("role") == "assistant" and m.get("tool_calls")),
+                default=len(fitted),
+            )
+            for i in range(last_round):
+                message = fitted[i]
+                if message.get("role") != "tool" or len(message.get("content") or "") <= self.tool_result_max_chars:
+                    continue
+                compacted = {**message, "content": compact_tool_result(message["content"], self.tool_result_max_chars)}
+                new_size = count_message_tokens(compacted)
+                total -= sizes[i] - new_size
+                fitted[i], sizes[i] = compacted, new_size
+                self.compacted_results += 1
+
+            # 2. Descarta do mais antigo para o mais novo, em blocos que não separam tool calls
+            if total > self.max_tokens:
+                protected = self._protected_indexes(fitted)
+                drop: set[int] = set()
+                for block in self._droppable_blocks(fitted, protected):
+                    if total <= self.max_tokens:
+                        break
+                    drop.update(block)
+                    total -= sum(sizes[i] for i in block)
+                if drop:
+                    self.dropped_messages += len(drop)
+                    fitted = [m for i, m in enumerate(fitted) if i not in drop]
+
+            if total > self.max_tokens:
+                logger.warning(f"Prompt acima do orçamento mesmo após cortes: {total} > {self.max_tokens} tokens")
+
+        self.calls += 1
+        self._total_tokens += total
+        self._max_seen_tokens = max(self._max_seen_tokens, total)
+        cut_info = f" (antes {original_total})" if total != original_total else ""
+        logger.info(f"Prompt: {total} tokens{cut_info} | {len(fitted)} mensagens | orçamento {self.max_tokens}")
+        return fitted
+
+    @staticmethod
+    def _protected_indexes(messages: list[dict]) -> set[int]:
+        """Prompt de sistema inicial, mensagens de sistema do turno e tudo a partir da última do cliente."""
+        protected = {i for i, m in enumerate(messages) if m.get("role") == "system"}
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=len(messages))
+        protected.update(range(last_user, len(messages)))
+        return protected
+
+    @staticmethod
+    def _droppable_blocks(messages: list[dict], protected: set[int]) -> list[list[int]]:
+        """Agrupa cada assistant com tool_calls às respostas de tool correspondentes."""
+        blocks: list[list[int]] = []
+        i = 0
+        while i < len(messages):
+            if i in protected:
+                i += 1
+                continue
+            block = [i]
+            if messages[i].get("role") == "assistant" and messages[i].get("tool_calls"):
+                j = i + 1
+                while j < len(messages) and messages[j].get("role") == "tool":
+                    block.append(j)
+                    j += 1
+            if any(k in protected for k in block):
+                i = max(block) + 1
+                continue
+            blocks.append(block)
+            i = max(block) + 1
+        return blocks
+
+    def stats(self) -> dict:
+        calls = self.calls or 1
+        return {
+            "orcamento_tokens": self.max_tokens,
+            "chamadas": self.calls,
+            "tokens_medio": round(self._total_tokens / calls),
+            "tokens_max": self._max_seen_tokens,
+            "acima_do_orcamento": self.over_budget,
+            "resultados_compactados": self.compacted_results,
+            "mensagens_descartadas": self.dropped_messages,
+        }
+
+
+# Instância global
+context_window = ContextWindow(settings.context_max_tokens, settings.tool_result_max_chars)
@@ -0,0 +1,111 @@
+"""
+Fila por lead: serializa os turnos de cada telefone e agrupa rajadas de mensagens.
+Mensagens que chegam dentro da janela de debounce viram um único turno do agente.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from core.config import settings
+from core.logger import logger
+from agent.sdr_agent import sdr_agent
+
+
+@dataclass
+class _LeadQueue:
+    """Estado da fila de um único lead."""
+    messages: list[str] = field(default_factory=list)
+    sender_name: str | None = None
+    first_at: float = 0.0
+    new_message: asyncio.Event = field(default_factory=asyncio.Event)
+    worker: asyncio.Task | None = None
+
+
+class LeadDispatcher:
+    """Um worker (ator) por telefone; turnos do mesmo lead nunca rodam em paralelo."""
+
+    def __init__(self):
+        self._queues: dict[str, _LeadQueue] = {}
+        self.turns_processed = 0
+        self.messages_coalesced = 0
+
+    def submit(self, phone: str, message: str, sender_name: str | None = None) -> None:
+        """Enfileira a mensagem e garante que o worker do lead está rodando."""
+        queue = self._queues.get(phone)
+        if queue is None:
+            queue = _LeadQueue()
+            self._queues[phone] = queue
+
+        if not queue.messages:
+            queue.first_at = time.monotonic()
+        queue.messages.append(message)
+        if sender_name:
+            queue.sender_name = sender_name
+        queue.new_message.set()
+
+        if queue.worker is None or queue.worker.done():
+            queue.worker = asyncio.create_task(self._run(phone, queue))
+
+    async def _run(self, phone: str, queue: _LeadQueue) -> None:
+        """Loop do worker: espera a rajada terminar, processa um turno, repete."""
+        try:
+            while queue.messages:
+                await self._wait_for_burst_end(queue)
+
+                batch = queue.messages
+                queue.messages = []
+                if len(batch) > 1:
+                    self.messages_coalesced += len(batch) - 1
+                    logger.info(f"{len(batch)} mensagens agrupadas em um turno para {phone[:8]}***")
+
+                try:
+                    await sdr_agent.process_message(
+                        phone=phone,
+                        message="\n".join(batch),
+                        sender_name=queue.sender_name,
+                    )
+                except Exception as e:
+                    logger.exception(f"Erro crítico no worker do lead {phone[:8]}***: {e}")
+                self.turns_processed += 1
+        finally:
+            # Remove a fila apenas se nenhuma mensagem chegou durante o último turno
+            if not queue.messages and self._queues.get(phone) is queue:
+                del self._queues[phone]
+
+    async def _wait_for_burst_end(self, queue: _LeadQueue) -> None:
+        """Aguarda até não chegar mensagem nova por `debounce` segundos (com teto máximo)."""
+        debounce = settings.message_debounce_seconds
+        deadline = queue.first_at + settings.message_debounce_max_seconds
+
+        while True:
+            queue.new_message.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(queue.new_message.wait(), timeout=min(debounce, remaining))
+            except asyncio.TimeoutError:
+                return
+
+    def stats(self) -> dict:
+        """Métricas da fila para monitoramento."""
+        return {
+            "leads_ativos": len(self._queues),
+            "mensagens_pendentes": sum(len(q.messages) for q in self._queues.values()),
+            "turnos_processados": self.turns_processed,
+            "mensagens_agrupadas": self.messages_coalesced,
+        }
+
+    async def aclose(self, timeout: float = 30) -> None:
+        """Aguarda os turnos em andamento terminarem (chamado no shutdown)."""
+        workers = [q.worker for q in self._queues.values() if q.worker and not q.worker.done()]
+        if not workers:
+            return
+        logger.info(f"Aguardando {len(workers)} turnos em andamento...")
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+
+# Instância global
+lead_dispatcher = LeadDispatcher()
@@ -0,0 +1,163 @@
+"""
+Respostas locais para mensagens triviais (saudações, agradecimentos, despedidas, emojis).
+Só responde quando a mensagem inteira é um padrão conhecido e não há pergunta ou oferta
+de orçamento pendente; em qualquer dúvida devolve None e o turno segue para o LLM.
+"""
+import re
+import unicodedata
+import zlib
+from datetime import datetime, timedelta
+
+from core.config import settings
+from core.logger import logger
+
+_PERIODS = ["bom dia", "boa tarde", "boa noite"]
+
+# Categoria → mensagens (normalizadas) respondidas localmente
+PATTERNS: dict[str, set[str]] = {
+    "saudacao": {
+        "oi", "ola", "opa", "e ai", "eai", "bom dia", "boa tarde", "boa noite",
+        *(f"{hello} {period}" for hello in ("oi", "ola", "opa") for period in _PERIODS),
+        *(f"{period} tudo bem" for period in _PERIODS),
+    },
+    "agradecimento": {
+        "obrigado", "obrigada", "muito obrigado", "muito obrigada", "obg", "valeu", "vlw",
+        "agradeco", "ok obrigado", "ok obrigada", "certo obrigado", "certo obrigada",
+    },
+    "despedida": {
+        "tchau", "ate mais", "ate logo", "ate amanha", "flw", "falou",
+        "obrigado tchau", "obrigada tchau",
+    },
+    "emoji": {"👍", "🙏", "❤️", "❤", "😊", "👍🏻", "👍🏼", "👍🏽", "🙏🏻", "🙏🏼", "🙏🏽"},
+}
+
+# Categoria → (modelos para lead novo, modelos para lead que retorna)
+# Variáveis: {saudacao}, {nome} (", Fulano" ou vazio), {agente}, {empresa}, {bom_periodo}
+TEMPLATES: dict[str, tuple[list[str], list[str]]] = {
+    "saudacao": (
+        [
+            "{saudacao}{nome}! Sou a {agente}, Consultora da {empresa}. Como posso auxiliá-lo?",
+            "{saudacao}{nome}! Sou a {agente}, Consultora da {empresa}. Em que posso ajudá-lo hoje?",
+        ],
+        [
+            "{saudacao}! Que bom falar com você novamente. Como posso auxiliá-lo?",
+            "{saudacao}! Em que posso ajudá-lo hoje?",
+        ],
+    ),
+    "agradecimento": (
+        [
+            "Eu que agradeço o contato! Permaneço à disposição para o que precisar.",
+            "Por nada! Qualquer dúvida, estou à disposição.",
+        ],
+        [
+            "Eu que agradeço! Permaneço à disposição para o que precisar.",
+            "Por nada! Qualquer dúvida, estou à disposição.",
+        ],
+    ),
+    "despedida": (
+        [
+            "Até logo! Tenha {bom_periodo}. Permaneço à disposição.",
+            "Agradeço o contato! Tenha {bom_periodo}.",
+        ],
+        [
+            "Até logo! Tenha {bom_periodo}. Permaneço à disposição.",
+            "Agradeço o contato! Tenha {bom_periodo}.",
+        ],
+    ),
+    "emoji": (
+        [
+            "{saudacao}{nome}! Sou a {agente}, Consultora da {empresa}. Como posso auxiliá-lo?",
+        ],
+        [
+            "Permaneço à disposição para o que precisar.",
+            "Combinado! Qualquer dúvida, estou à disposição.",
+        ],
+    ),
+}
+
+# Se a última mensagem do agente contém isto, a mensagem curta pode ser uma resposta: vai ao LLM
+_PENDING_HINTS = ("orçamento", "orcamento", "pedido", "confirma", "posso seguir")
+
+
+def _normalize(message: str) -> str:
+    """Caixa baixa, sem acentos e sem pontuação; emojis são mantidos."""
+    text = unicodedata.normalize("NFKD", message.strip().lower())
+    text = "".join(c for c in text if not unicodedata.combining(c) or ord(c) > 0x2000)
+    text = re.sub(r"[!?.,;:~]+", " ", text)
+    return " ".join(text.split())
+
+
+def _brasilia_now() -> datetime:
+    return datetime.utcnow() - timedelta(hours=3)
+
+
+def _period(now: datetime) -> tuple[str, str]:
+    """(saudação, "tenha ...") conforme a hora em Brasília."""
+    if 5 <= now.hour < 12:
+        return "Bom dia", "um ótimo dia"
+    if 12 <= now.hour < 18:
+        return "Boa tarde", "uma ótima tarde"
+    return "Boa noite", "uma ótima noite"
+
+
+class FastPathResponder:
+    """Responde turnos triviais com modelos fixos, sem chamar o LLM."""
+
+    def __init__(self, categories: str):
+        self.enabled = {c.strip() for c in categories.split(",") if c.strip()}
+        unknown = self.enabled - PATTERNS.keys()
+        if unknown:
+            logger.warning(f"FAST_PATH_CATEGORIES: categorias desconhecidas ignoradas: {sorted(unknown)}")
+        self._by_message = {
+            pattern: category
+            for category, patterns in PATTERNS.items() if category in self.enabled
+            for pattern in patterns
+        }
+        self.answered: dict[str, int] = {}
+        self.deferred = 0
+
+    def reply(self, message: str, history: list[dict], context: dict) -> str | None:
+        """Resposta pronta para a mensagem ou None (segue para o LLM)."""
+        category = self._by_message.get(_normalize(message))
+        if category is None:
+            return None
+
+        last_assistant = next(
+            (m.get("content") or "" for m in reversed(history) if m.get("role") == "assistant"), None
+        )
+        if last_assistant is not None:
+            pending = last_assistant.lower()
+            if pending.rstrip().endswith("?") or any(hint in pending for hint in _PENDING_HINTS):
+                self.deferred += 1
+                return None
+
+        is_new = last_assistant is None and not context.get("summary")
+        templates = TEMPLATES[category][0 if is_new else 1]
+
+        now = _brasilia_now()
+        saudacao, bom_periodo = _period(now)
+        first_name = (context.get("lead_name") or "").split()
+        # Variação estável no dia por lead (a mesma conversa não alterna de modelo)
+        seed = zlib.crc32(f"{context.get('lead_id')}:{now:%Y%m%d}:{category}".encode())
+        text = templates[seed % len(templates)].format(
+            saudacao=saudacao,
+            nome=f", {first_name[0]}" if first_name else "",
+            agente=settings.agent_name,
+            empresa=settings.company_name,
+            bom_periodo=bom_periodo,
+        )
+        self.answered[category] = self.answered.get(category, 0) + 1
+        logger.info(f"Resposta local ({category}), sem chamada ao LLM")
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "categorias": sorted(self.enabled),
+            "chamadas_llm_evitadas": sum(self.answered.values()),
+            "por_categoria": dict(self.answered),
+            "encaminhadas_ao_llm": self.deferred,
+        }
+
+
+# Instância global
+fast_path = FastPathResponder(settings.fast_path_categories)
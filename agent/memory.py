@@ -1,121 +1,238 @@
 """
 Gerenciamento de memória persistente do agente via Supabase.
+Métodos assíncronos: as queries rodam no pool limitado de db.supabase_client.
 """
-import uuid
-from datetime import datetime
+from core.cache import TTLCache
 from core.logger import logger
 from core.exceptions import SupabaseError
 from core.config import settings
-from db.supabase_client import supabase
+from db.supabase_client import supabase, execute_async
+
+
+def _history_size(history: list[dict]) -> int:
+    """Tamanho aproximado (bytes) de uma janela de histórico em cache."""
+    return sum(len(m["content"].encode("utf-8")) + 64 for m in history)
+
+
+def _is_missing_function(error: Exception) -> bool:
+    """True se o PostgREST recusou a RPC por ela não existir (schema.sql não aplicado)."""
+    return getattr(error, "code", None) in ("PGRST202", "42883")
+
+
+def quote_state(lead: dict) -> tuple[bool, dict | None]:
+    """
+    Estado de orçamento desnormalizado no lead (mantido por `save_orcamento`).
+    Retorna (has_orcamento, resumo do último orçamento ou None).
+    """
+    if not (lead.get("orcamentos_count") or 0) > 0:
+        return False, None
+    return True, {
+        "id": lead.get("last_orcamento_id"),
+        "valor_total": lead.get("last_valor_total") or 0,
+        "pdf_url": lead.get("last_pdf_url") or "",
+    }
 
 
 class AgentMemory:
     """Gerencia leads e histórico de mensagens no Supabase."""
 
+    def __init__(self):
+        # Cache telefone→lead (evita round trips na resolução do lead)
+        self._lead_cache = TTLCache(
+            max_items=settings.lead_cache_max_entries,
+            ttl=settings.lead_cache_ttl_seconds,
+        )
+        # Janela recente de mensagens por lead (write-through em save_message).
+        # Válido com um único worker, que é como a aplicação roda (ver Dockerfile).
+        self._history_cache = TTLCache(
+            max_items=settings.history_cache_max_leads,
+            max_bytes=settings.history_cache_max_bytes,
+            sizeof=_history_size,
+        )
+        # Desligado se o banco não tiver a RPC carregar_contexto_turno
+        self._turn_rpc_available = True
+
     # ===== LEADS =====
 
-    def get_or_create_lead(self, phone: str, name: str | None = None) -> dict:
+    async def get_or_create_lead(self, phone: str, name: str | None = None) -> dict:
         """
         Retorna o lead existente ou cria um novo.
         Atualiza o nome se fornecido e ainda não estava salvo.
+        Cache telefone→lead no caminho quente; em cache miss, um único upsert
+        (ON CONFLICT telefone) resolve o lead sem corrida entre mensagens simultâneas.
         """
+        lead = self._lead_cache.get(phone)
         try:
-            # Busca lead existente
-            result = (
-                supabase.table("leads")
-                .select("*")
-                .eq("telefone", phone)
-                .execute()
-            )
-
-            if result.data:
+            if lead is None:
+                result = await execute_async(
+                    supabase.table("leads")
+                    .upsert({"telefone": phone}, on_conflict="telefone")
+                )
                 lead = result.data[0]
-                # Atualiza nome se veio novo e ainda estava vazio
-                if name and not lead.get("nome"):
-                    updated = (
-                        supabase.table("leads")
-                        .update({"nome": name})
-                        .eq("id", lead["id"])
-                        .execute()
-                    )
-                    lead = updated.data[0]
-                logger.debug(f"Lead existente encontrado: {lead['id']}")
-                return lead
-
-            # Cria novo lead
-            new_lead = {
-                "telefone": phone,
-                "nome": name or None,
-                "status": "novo",
-            }
-            result = supabase.table("leads").insert(new_lead).execute()
-            lead = result.data[0]
-            logger.info(f"Novo lead criado: {lead['id']} | {phone[:8]}***")
-            return lead
+                self._lead_cache.set(phone, lead)
+                logger.debug(f"Lead resolvido: {lead['id']} | {phone[:8]}***")
+
+            # Atualiza nome se veio novo e ainda estava vazio
+            if name and not lead.get("nome"):
+                lead = await self.update_lead(lead["id"], {"nome": name}) or lead
+
+            return dict(lead)
 
         except Exception as e:
             logger.error(f"Erro ao get_or_create_lead: {e}")
             raise SupabaseError(f"Falha ao gerenciar lead: {e}")
 
-    def update_lead(self, lead_id: str, data: dict) -> dict:
-        """Atualiza campos do lead."""
+    async def get_lead_by_id(self, lead_id: str) -> dict | None:
+        """Lê o lead direto do banco (fora do caminho quente, ex.: jobs em background)."""
         try:
-            result = (
+            result = await execute_async(
+                supabase.table("leads")
+                .select("*")
+                .eq("id", lead_id)
+                .limit(1)
+            )
+            return dict(result.data[0]) if result.data else None
+        except Exception as e:
+            logger.error(f"Erro ao buscar lead {lead_id}: {e}")
+            raise SupabaseError(f"Falha ao buscar lead: {e}")
+
+    async def update_lead(self, lead_id: str, data: dict) -> dict:
+        """Atualiza campos do lead (write-through no cache telefone→lead)."""
+        try:
+            result = await execute_async(
                 supabase.table("leads")
                 .update(data)
                 .eq("id", lead_id)
-                .execute()
             )
-            return result.data[0] if result.data else {}
+            if not result.data:
+                return {}
+            lead = result.data[0]
+            self._lead_cache.set(lead["telefone"], lead)
+            return dict(lead)
         except Exception as e:
             logger.error(f"Erro ao atualizar lead {lead_id}: {e}")
             raise SupabaseError(f"Falha ao atualizar lead: {e}")
 
+    # ===== CONTEXTO DO TURNO =====
+
+    async def load_turn_context(self, phone: str, message: str, name: str | None = None) -> dict:
+        """
+        Resolve o lead, salva a mensagem recebida e carrega o contexto do turno:
+        {"lead", "history", "has_orcamento", "last_orcamento"}.
+
+        Cache frio: uma única chamada à RPC `carregar_contexto_turno` (1 round trip).
+        Cache quente (lead + histórico em memória): apenas a gravação da mensagem.
+        Sem a RPC no banco: lead, gravação e histórico em chamadas sequenciais.
+        O estado de orçamento vem do próprio lead (colunas desnormalizadas).
+        """
+        lead = self._lead_cache.get(phone)
+        if self._turn_rpc_available and (lead is None or lead["id"] not in self._history_cache):
+            try:
+                return await self._load_turn_context_rpc(phone, message, name)
+            except Exception as e:
+                # Só cai para o carregamento passo a passo se a RPC não existe: qualquer outra
+                # falha (ex.: timeout após o commit) pode já ter gravado a mensagem
+                if not _is_missing_function(e):
+                    logger.error(f"Erro na RPC carregar_contexto_turno: {e}")
+                    raise SupabaseError(f"Falha ao carregar contexto do turno: {e}")
+                self._turn_rpc_available = False
+                logger.warning(f"RPC carregar_contexto_turno não encontrada, usando carregamento sequencial: {e}")
+
+        lead = await self.get_or_create_lead(phone=phone, name=name)
+        await self.save_message(lead_id=lead["id"], role="user", content=message)
+        history = await self.get_history(lead_id=lead["id"])
+        has_orcamento, last_orcamento = quote_state(lead)
+        return {
+            "lead": lead,
+            "history": history,
+            "has_orcamento": has_orcamento,
+            "last_orcamento": last_orcamento,
+        }
+
+    async def _load_turn_context_rpc(self, phone: str, message: str, name: str | None) -> dict:
+        result = await execute_async(
+            supabase.rpc("carregar_contexto_turno", {
+                "p_telefone": phone,
+                "p_nome": name,
+                "p_conteudo": message,
+                "p_limite": settings.max_history_messages,
+            })
+        )
+        data = result.data
+        lead = data["lead"]
+        history = data["historico"] or []
+
+        # Semeia os caches para os próximos turnos
+        self._lead_cache.set(phone, lead)
+        self._history_cache.set(lead["id"], [dict(m) for m in history])
+
+        logger.debug(f"Contexto do turno carregado via RPC: {len(history)} mensagens")
+        has_orcamento, last_orcamento = quote_state(lead)
+        return {
+            "lead": dict(lead),
+            "history": history,
+            "has_orcamento": has_orcamento,
+            "last_orcamento": last_orcamento,
+        }
+
     # ===== MENSAGENS =====
 
-    def save_message(self, lead_id: str, role: str, content: str) -> dict:
+    async def save_message(self, lead_id: str, role: str, content: str) -> dict:
         """Salva uma mensagem no histórico com direction e status."""
         try:
             direction = "outbound" if role == "assistant" else "inbound"
             status = "sent" if role == "assistant" else "received"
 
-            result = supabase.table("messages").insert({
+            result = await execute_async(supabase.table("messages").insert({
                 "lead_id": lead_id,
                 "role": role,
                 "content": content,
                 "direction": direction,
                 "status": status,
-            }).execute()
-            return result.data[0] if result.data else {}
+            }))
+            saved = result.data[0] if result.data else {}
+            self._append_to_history_cache(lead_id, role, content, saved.get("criado_em"))
+            return saved
         except Exception as e:
             logger.error(f"Erro ao salvar mensagem: {e}")
             raise SupabaseError(f"Falha ao salvar mensagem: {e}")
 
-    def get_history(self, lead_id: str, limit: int | None = None) -> list[dict]:
+    async def get_history(self, lead_id: str, limit: int | None = None) -> list[dict]:
         """
-        Retorna o histórico de mensagens formatado para a API do Grok.
-        Formato: [{"role": "user"/"assistant", "content": "..."}]
+        Retorna as mensagens MAIS RECENTES do lead, em ordem cronológica,
+        formatadas para a API do Grok.
+        Formato: [{"role": "user"/"assistant", "content": "...", "criado_em": "..."}]
+        (criado_em separa o que já está no resumo do lead; não é enviado ao Grok)
+        Usa o cache da janela recente; o banco só é consultado em cache miss.
         """
+        max_msgs = limit or settings.max_history_messages
+        if max_msgs <= settings.max_history_messages:
+            cached = self._history_cache.get(lead_id)
+            if cached is not None:
+                return [dict(m) for m in cached[-max_msgs:]]
+
         try:
-            max_msgs = limit or settings.max_history_messages
-            result = (
+            result = await execute_async(
                 supabase.table("messages")
                 .select("role, content, criado_em")
                 .eq("lead_id", lead_id)
-                .order("criado_em", desc=False)
+                .order("criado_em", desc=True)
                 .limit(max_msgs)
-                .execute()
             )
 
             history = []
-            for msg in result.data:
+            for msg in reversed(result.data):
                 # Filtra apenas roles válidos para o Grok (user/assistant)
                 if msg["role"] in ("user", "assistant"):
                     history.append({
                         "role": msg["role"],
                         "content": msg["content"],
+                        "criado_em": msg["criado_em"],
                     })
 
+            if max_msgs == settings.max_history_messages:
+                self._history_cache.set(lead_id, [dict(m) for m in history])
+
             logger.debug(f"Histórico carregado: {len(history)} mensagens")
             return history
 
@@ -123,14 +240,45 @@ class AgentMemory:
             logger.error(f"Erro ao carregar histórico: {e}")
             return []  # Falha graciosamente — começa conversa sem histórico
 
-    def is_returning_customer(self, lead_id: str) -> bool:
+    async def get_messages_since(self, lead_id: str, since: str | None, limit: int = 200) -> list[dict]:
+        """
+        As `limit` primeiras mensagens user/assistant do lead posteriores a `since`
+        (criado_em), em ordem cronológica e com o criado_em. Sem `since`, desde o início.
+        Para ler um backlog maior, chame de novo a partir do criado_em da última.
+        """
+        query = (
+            supabase.table("messages")
+            .select("role, content, criado_em")
+            .eq("lead_id", lead_id)
+            .in_("role", ["user", "assistant"])
+        )
+        if since:
+            query = query.gt("criado_em", since)
+        try:
+            result = await execute_async(query.order("criado_em").limit(limit))
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Erro ao carregar mensagens para resumo: {e}")
+            raise SupabaseError(f"Falha ao carregar mensagens: {e}")
+
+    def _append_to_history_cache(self, lead_id: str, role: str, content: str, criado_em: str | None) -> None:
+        """Write-through: mantém a janela em cache alinhada com o que foi salvo."""
+        if role not in ("user", "assistant"):
+            return
+        cached = self._history_cache.get(lead_id)
+        if cached is None:
+            return  # Sem cache: a próxima leitura carrega do banco
+        cached.append({"role": role, "content": content, "criado_em": criado_em})
+        del cached[:-settings.max_history_messages]
+        self._history_cache.set(lead_id, cached)
+
+    async def is_returning_customer(self, lead_id: str) -> bool:
         """Verifica se o cliente já teve conversas anteriores."""
         try:
-            result = (
+            result = await execute_async(
                 supabase.table("messages")
                 .select("id", count="exact")
                 .eq("lead_id", lead_id)
-                .execute()
             )
             return (result.count or 0) > 0
         except Exception:
@@ -138,62 +286,131 @@ class AgentMemory:
 
     # ===== ORÇAMENTOS =====
 
-    def has_orcamento(self, lead_id: str) -> bool:
+    async def has_orcamento(self, lead_id: str) -> bool:
         """Verifica se o lead já possui ao menos um orçamento gerado."""
         try:
-            result = (
+            result = await execute_async(
                 supabase.table("orcamentos")
                 .select("id", count="exact")
                 .eq("lead_id", lead_id)
-                .execute()
             )
             return (result.count or 0) > 0
         except Exception:
             return False  # Em caso de erro, não bloqueia
 
-    def get_last_orcamento(self, lead_id: str) -> dict | None:
+    async def get_last_orcamento(self, lead_id: str) -> dict | None:
         """Retorna o último orçamento gerado para o lead."""
         try:
-            result = (
+            result = await execute_async(
                 supabase.table("orcamentos")
                 .select("*")
                 .eq("lead_id", lead_id)
                 .order("criado_em", desc=True)
                 .limit(1)
-                .execute()
             )
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Erro ao buscar último orçamento: {e}")
             return None
 
-    def save_orcamento(
+    async def save_orcamento(
         self,
         lead_id: str,
+        numero: str,
         itens: list[dict],
         valor_total: float,
         pdf_url: str,
         observacoes: str = "",
     ) -> dict:
-        """Salva registro do orçamento gerado."""
+        """
+        Salva registro do orçamento gerado (o `numero` é o mesmo impresso no PDF).
+        A RPC `salvar_orcamento` insere o orçamento e atualiza, na mesma transação,
+        o estado desnormalizado do lead (last_*, orcamentos_count) e o status.
+        É idempotente pelo número: repetir a chamada (retentativa) não duplica nada.
+        Sem a RPC no banco, grava direto nas tabelas (também idempotente).
+        """
+        params = {
+            "p_lead_id": lead_id,
+            "p_numero": numero,
+            "p_itens": itens,
+            "p_valor_total": valor_total,
+            "p_pdf_url": pdf_url,
+            "p_observacoes": observacoes,
+            "p_validade_dias": settings.quote_validity_days,
+        }
         try:
-            numero = f"ORC-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
-            result = supabase.table("orcamentos").insert({
-                "numero": numero,
-                "lead_id": lead_id,
-                "itens": itens,
-                "valor_total": valor_total,
-                "pdf_url": pdf_url,
-                "status": "enviado",
-                "observacoes": observacoes,
-                "validade_dias": settings.quote_validity_days,
-            }).execute()
+            try:
+                result = await execute_async(supabase.rpc("salvar_orcamento", params))
+                data = result.data or {}
+            except Exception as e:
+                if not _is_missing_function(e):
+                    raise
+                logger.warning(f"RPC salvar_orcamento não encontrada, gravando nas tabelas: {e}")
+                data = await self._save_orcamento_tables(params)
+            lead = data.get("lead")
+            if lead:
+                self._lead_cache.set(lead["telefone"], lead)
             logger.info(f"Orçamento salvo: {numero} | R$ {valor_total:.2f}")
-            return result.data[0] if result.data else {}
+            return data.get("orcamento") or {}
         except Exception as e:
-            logger.error(f"Erro ao salvar orçamento: {e}")
+            logger.error(f"Erro ao salvar orçamento {numero}: {e}")
             raise SupabaseError(f"Falha ao salvar orçamento: {e}")
 
+    async def _save_orcamento_tables(self, params: dict) -> dict:
+        """Equivalente da RPC salvar_orcamento em chamadas separadas (sem transação)."""
+        inserted = await execute_async(
+            supabase.table("orcamentos").upsert({
+                "numero": params["p_numero"],
+                "lead_id": params["p_lead_id"],
+                "itens": params["p_itens"],
+                "valor_total": params["p_valor_total"],
+                "pdf_url": params["p_pdf_url"],
+                "status": "enviado",
+                "observacoes": params["p_observacoes"],
+                "validade_dias": params["p_validade_dias"],
+            }, on_conflict="numero", ignore_duplicates=True)
+        )
+        if not inserted.data:
+            return {}  # Número já gravado (retentativa): nada a atualizar
+        orcamento = inserted.data[0]
+        # Contagem pelo banco (não incrementa): repetir não conta duas vezes
+        count = await execute_async(
+            supabase.table("orcamentos")
+            .select("id", count="exact")
+            .eq("lead_id", params["p_lead_id"])
+        )
+        lead = await self.update_lead(params["p_lead_id"], {
+            "last_orcamento_id": orcamento["id"],
+            "last_valor_total": orcamento["valor_total"],
+            "last_pdf_url": orcamento["pdf_url"],
+            "orcamentos_count": count.count or 1,
+            "status": "orcamento_enviado",
+        })
+        return {"orcamento": orcamento, "lead": lead or None}
+
+    def record_pending_quote(self, phone: str, valor_total: float, pdf_url: str) -> None:
+        """
+        Marca no lead em cache o orçamento que acabou de ser gerado, antes de o job de
+        persistência terminar: o próximo turno já vê has_orcamento=True.
+        """
+        lead = self._lead_cache.get(phone)
+        if lead is None:
+            return
+        self._lead_cache.set(phone, {
+            **lead,
+            "orcamentos_count": (lead.get("orcamentos_count") or 0) + 1,
+            "last_valor_total": valor_total,
+            "last_pdf_url": pdf_url,
+            "status": "orcamento_enviado",
+        })
+
+    def cache_stats(self) -> dict:
+        """Métricas dos caches em memória."""
+        return {
+            "leads": self._lead_cache.stats(),
+            "historico": self._history_cache.stats(),
+        }
+
 
 # Instância global
 memory = AgentMemory()
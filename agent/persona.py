@@ -1,28 +1,23 @@
+"""
+Persona e prompt de sistema do agente.
+A parte estática (persona + base de conhecimento) é montada uma única vez e reaproveitada;
+é recarregada quando o knowledge.md muda (mtime) ou via endpoint administrativo.
+A cada turno só a parte dinâmica (cliente, data e hora) é acrescentada ao final.
+"""
+import os
 from datetime import datetime, timedelta
+from pathlib import Path
+
 from core.config import settings
+from core.logger import logger
 
+KNOWLEDGE_PATH = Path(__file__).parent / "knowledge.md"
 
-def get_system_prompt(customer_name: str | None = None) -> str:
+
+def _render_static_prompt(knowledge_content: str) -> str:
     name = settings.agent_name
     company = settings.company_name
 
-    # Horário de Brasília (UTC-3)
-    now = datetime.utcnow() - timedelta(hours=3)
-    current_time = now.strftime('%d/%m/%Y às %H:%M')
-    today = now.strftime('%d/%m/%Y')
-
-    # Base de Conhecimento
-    try:
-        with open("agent/knowledge.md", "r", encoding="utf-8") as f:
-            knowledge_content = f.read()
-    except FileNotFoundError:
-        knowledge_content = "Nenhuma base de conhecimento encontrada."
-
-    # Contexto do cliente
-    context_str = ""
-    if customer_name:
-        context_str = f"\nCliente: {customer_name}. Use o nome APENAS no primeiro cumprimento. Nunca repita.\n"
-
     return f"""Você é {name}, Consultora Comercial Sênior da {company}. Sua comunicação deve ser pautada pelo profissionalismo, precisão e cortesia.
 
 ========================
@@ -80,8 +75,98 @@ BASE DE CONHECIMENTO
 ========================
 
 {knowledge_content}
-
-========================
-Informações Auxiliares:
-Hoje é {today} | Horário de Brasília: {current_time}
 """
+
+
+class PromptBuilder:
+    """Monta o prompt de sistema a partir da parte estática pré-renderizada."""
+
+    def __init__(self, knowledge_path: Path = KNOWLEDGE_PATH):
+        self.knowledge_path = knowledge_path
+        self._static: str | None = None
+        self._mtime: float | None = None
+        self.reloads = 0
+        self.builds = 0
+        self._last_size = 0
+
+    def _knowledge_mtime(self) -> float | None:
+        try:
+            return os.stat(self.knowledge_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def static_prompt(self) -> str:
+        """Persona + base de conhecimento, renderizadas de novo só se o arquivo mudou."""
+        if self._static is None or self._knowledge_mtime() != self._mtime:
+            self.reload()
+        return self._static
+
+    def reload(self) -> int:
+        """Relê o knowledge.md e re-renderiza a parte estática. Retorna o tamanho em bytes."""
+        self._mtime = self._knowledge_mtime()
+        try:
+            knowledge_content = self.knowledge_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            knowledge_content = "Nenhuma base de conhecimento encontrada."
+        self._static = _render_static_prompt(knowledge_content)
+        self.reloads += 1
+        size = len(self._static.encode("utf-8"))
+        logger.info(f"Prompt de sistema carregado: {size} bytes")
+        return size
+
+    def turn_context(self, customer_name: str | None = None, has_orcamento: bool = False) -> str:
+        """
+        Parte dinâmica do turno (cliente, orçamento já enviado, data e hora). Vai no FIM das
+        mensagens, depois do histórico, para não quebrar o prefixo em cache no provedor.
+        """
+        # Horário de Brasília (UTC-3)
+        now = datetime.utcnow() - timedelta(hours=3)
+        current_time = now.strftime('%d/%m/%Y às %H:%M')
+        today = now.strftime('%d/%m/%Y')
+
+        # Contexto do cliente
+        context_str = ""
+        if customer_name:
+            context_str = f"\nCliente: {customer_name}. Use o nome APENAS no primeiro cumprimento. Nunca repita.\n"
+        # As tools são sempre as mesmas (prefixo estável): a restrição vai aqui, em texto
+        if has_orcamento:
+            context_str += (
+                "\nEste cliente JÁ recebeu um orçamento. NÃO chame gerar_orcamento; "
+                "use os dados do último orçamento.\n"
+            )
+
+        return (
+            f"{context_str}\n"
+            "========================\n"
+            "Informações Auxiliares:\n"
+            f"Hoje é {today} | Horário de Brasília: {current_time}\n"
+        )
+
+    def build(self, customer_name: str | None = None) -> str:
+        """Prompt completo do turno numa única string: parte estática + parte dinâmica."""
+        prompt = f"{self.static_prompt()}{self.turn_context(customer_name)}"
+        self.record_size(len(prompt))
+        return prompt
+
+    def record_size(self, chars: int) -> None:
+        """Registra o tamanho do prompt de sistema enviado no turno (para /metrics)."""
+        self.builds += 1
+        self._last_size = chars
+
+    def stats(self) -> dict:
+        static = self._static or ""
+        return {
+            "bytes_estatico": len(static.encode("utf-8")),
+            "caracteres_ultimo_prompt": self._last_size,
+            "tokens_estimados": self._last_size // 4,
+            "montagens": self.builds,
+            "recarregamentos": self.reloads,
+        }
+
+
+def get_system_prompt(customer_name: str | None = None) -> str:
+    return prompt_builder.build(customer_name)
+
+
+# Instância global
+prompt_builder = PromptBuilder()
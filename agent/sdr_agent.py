@@ -13,7 +13,11 @@ from core.logger import logger
 from core.exceptions import GrokAPIError, EvolutionAPIError, SDRAgentError
 from integrations.grok_client import grok_client
 from integrations.evolution_client import evolution_client
-from agent.persona import get_system_prompt
+from integrations.outbound_dispatcher import outbound_dispatcher
+from agent.persona import prompt_builder
+from agent.context_window import context_window
+from agent.summarizer import conversation_summarizer, summary_message
+from agent.fast_path import fast_path
 from agent.memory import memory
 from agent.tools import TOOLS_DEFINITION, execute_tool
 
@@ -103,50 +107,72 @@ class SDRAgent:
         logger.info(f"Processando mensagem de {phone[:8]}***")
 
         try:
-            lead = memory.get_or_create_lead(phone=phone, name=sender_name)
+            # Lead + gravação da mensagem + histórico + orçamento em um único carregamento
+            turn = await memory.load_turn_context(phone=phone, message=message, name=sender_name)
+            lead = turn["lead"]
             lead_id = lead["id"]
-            memory.save_message(lead_id=lead_id, role="user", content=message)
-            history = memory.get_history(lead_id=lead_id)
+            history = turn["history"]
 
-            has_orcamento = memory.has_orcamento(lead_id)
             context = {
                 "lead_id": lead_id,
                 "phone": phone,
                 "lead_name": lead.get("nome"),
-                "has_orcamento": has_orcamento,
+                "has_orcamento": turn["has_orcamento"],
+                "last_orcamento": turn["last_orcamento"],
+                "summary": lead.get("resumo") if conversation_summarizer.enabled else None,
+                "summary_until": lead.get("resumo_ate"),
             }
 
             asyncio.create_task(evolution_client.send_typing(phone, 2000))
 
-            response_text = await self._agent_loop(
-                history=history,
-                context=context,
-                last_message=message,
-            )
+            # Saudações/agradecimentos sem pendência: resposta local, sem round trip ao LLM
+            response_text = fast_path.reply(message, history, context)
+            if response_text is None:
+                response_text = await self._agent_loop(
+                    history=history,
+                    context=context,
+                    last_message=message,
+                )
 
             if response_text:
-                memory.save_message(lead_id=lead_id, role="assistant", content=response_text)
-                await evolution_client.send_message_humanized(phone=phone, message=response_text)
+                await memory.save_message(lead_id=lead_id, role="assistant", content=response_text)
+                # Entrega agendada: o turno termina sem esperar o delay de digitação
+                outbound_dispatcher.schedule_humanized(phone=phone, message=response_text)
+
+            # Mensagem do cliente + resposta: conta para o próximo resumo da conversa
+            conversation_summarizer.record_messages(lead_id, 2 if response_text else 1)
 
         except Exception as e:
             logger.exception(f"Erro ao processar mensagem: {e}")
             await self._send_fallback(phone)
 
     async def _agent_loop(self, history: list[dict], context: dict, last_message: str = "") -> str | None:
-        system_prompt = get_system_prompt(customer_name=context.get("lead_name"))
+        # Layout amigável ao cache de prefixo do provedor: persona + conhecimento e a lista
+        # completa de tools são idênticos em todo turno; histórico em seguida (cresce só no fim);
+        # dados do lead e do turno (nome, data, hora) por último.
+        # Com resumo acumulado do lead: resumo + só as mensagens ainda não resumidas.
+        static_prompt = prompt_builder.static_prompt()
+        # As tools não são filtradas (mudariam o prefixo): o lead com orçamento é avisado no
+        # contexto do turno e, se ainda assim chamar gerar_orcamento, a chamada é barrada
+        quote_locked = bool(context.get("has_orcamento"))
+        turn_context = prompt_builder.turn_context(
+            customer_name=context.get("lead_name"), has_orcamento=quote_locked
+        )
+        summary = context.get("summary")
+        if summary:
+            history = conversation_summarizer.unsummarized(history, context.get("summary_until"))
         messages = [
-            {"role": "system", "content": system_prompt},
-            *history,
-        ]
-
-        available_tools = [
-            t for t in TOOLS_DEFINITION
-            if not (t["function"]["name"] == "gerar_orcamento" and context.get("has_orcamento"))
+            {"role": "system", "content": static_prompt},
+            *([summary_message(summary)] if summary else []),
+            # Só role/content vão ao Grok (criado_em é metadado interno do histórico)
+            *({"role": m["role"], "content": m["content"]} for m in history),
+            {"role": "system", "content": turn_context},
         ]
+        prompt_builder.record_size(len(static_prompt) + len(turn_context))
 
         is_simple = _is_simple_message(last_message)
         force_gerar_orcamento = (
-            not context.get("has_orcamento")
+            not quote_locked
             and _is_orcamento_confirmation(last_message, history)
         )
 
@@ -156,18 +182,15 @@ class SDRAgent:
 
             if force_gerar_orcamento and iterations == 1:
                 effective_tool_choice = {"type": "function", "function": {"name": "gerar_orcamento"}}
-                effective_tools = [t for t in available_tools if t["function"]["name"] == "gerar_orcamento"]
                 force_gerar_orcamento = False
             elif is_simple:
                 effective_tool_choice = "none"
-                effective_tools = []
             else:
-                effective_tool_choice = "auto" if available_tools else "none"
-                effective_tools = available_tools
+                effective_tool_choice = "auto"
 
-            response = grok_client.chat(
-                messages=messages,
-                tools=effective_tools,
+            response = await grok_client.chat(
+                messages=context_window.fit(messages, TOOLS_DEFINITION),
+                tools=TOOLS_DEFINITION,
                 tool_choice=effective_tool_choice,
             )
 
@@ -198,10 +221,10 @@ class SDRAgent:
                                         "content": msg.content,
                                         "tool_calls": [{"id": fake_id, "type": "function", "function": {"name": tool_name, "arguments": json.dumps(tool_args)}}]
                                     })
-                                    result_str = await execute_tool(tool_name, tool_args, context)
+                                    result_str = await self._execute_tool(tool_name, tool_args, context, quote_locked)
                                     messages.append({"role": "tool", "tool_call_id": fake_id, "content": result_str})
                                     if tool_name == "gerar_orcamento":
-                                        self._persist_orcamento_result(result_str, context)
+                                        await self._persist_orcamento_result(result_str, context)
                                     continue # Re-analisa com resultado da tool
                             except Exception as e:
                                 logger.warning(f"Erro na intercepção: {e}")
@@ -234,7 +257,7 @@ class SDRAgent:
                         tool_args = json.loads(tool_call.function.arguments)
                     except json.JSONDecodeError:
                         tool_args = {}
-                    tool_tasks.append((tool_call.id, tool_name, execute_tool(tool_name, tool_args, context)))
+                    tool_tasks.append((tool_call.id, tool_name, self._execute_tool(tool_name, tool_args, context, quote_locked)))
 
                 results = await asyncio.gather(*[task[2] for task in tool_tasks], return_exceptions=True)
 
@@ -243,27 +266,36 @@ class SDRAgent:
                     result_str = json.dumps({"erro": str(result)}) if isinstance(result, Exception) else result
                     messages.append({"role": "tool", "tool_call_id": tool_call_id, "content": result_str})
                     if tool_name == "gerar_orcamento":
-                        self._persist_orcamento_result(result_str, context)
+                        await self._persist_orcamento_result(result_str, context)
 
                 continue # Volta ao loop para processar resultados
 
         return "Peço desculpas. Poderia reformular seu pedido?"
 
-    def _persist_orcamento_result(self, result_str: str, context: dict) -> None:
+    async def _execute_tool(self, tool_name: str, tool_args: dict, context: dict, quote_locked: bool) -> str:
+        """Executa a tool, recusando gerar_orcamento quando o lead já tinha orçamento no início do turno."""
+        if quote_locked and tool_name == "gerar_orcamento":
+            logger.info("gerar_orcamento recusado: lead já possui orçamento")
+            return json.dumps({
+                "erro": "Este cliente já recebeu um orçamento. Não gere outro; use os dados do último orçamento.",
+            }, ensure_ascii=False)
+        return await execute_tool(tool_name, tool_args, context)
+
+    async def _persist_orcamento_result(self, result_str: str, context: dict) -> None:
         """Persiste o resultado da geração de orçamento no banco de dados."""
         try:
             result_data = json.loads(result_str) if isinstance(result_str, str) else {}
             if result_data.get("sucesso"):
                 lead_id = context.get("lead_id")
                 if lead_id:
-                    memory.save_message(
+                    await memory.save_message(
                         lead_id=lead_id,
                         role="assistant",
                         content=(
                             f"[ORÇAMENTO ENVIADO] Número: {result_data.get('numero')} | "
                             f"Total: R$ {result_data.get('valor_total', 0):,.2f} | "
                             f"Validade: {result_data.get('validade')} | "
-                            "Status: PDF enviado ao cliente com sucesso."
+                            "Status: PDF gerado, envio ao cliente em andamento."
                         ),
                     )
         except Exception as e:
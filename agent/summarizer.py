@@ -0,0 +1,167 @@
+"""
+Resumo acumulado da conversa por lead.
+A cada N mensagens novas, um job em background funde o resumo anterior com as mensagens
+que saíram da cauda recente e grava o resultado no lead (colunas resumo / resumo_ate).
+No turno, o agente envia o resumo + só as mensagens posteriores a ele (no máximo
+cauda + intervalo entre resumos) em vez da janela bruta do histórico.
+"""
+from datetime import datetime
+
+from core.background import background_jobs
+from core.cache import TTLCache
+from core.config import settings
+from core.logger import logger
+from integrations.grok_client import grok_client
+from agent.memory import memory
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Você mantém o resumo de uma conversa de vendas por WhatsApp entre um cliente e a "
+    "vendedora {agent_name}, da {company_name} (telhas, calhas, metalon e portas metálicas). "
+    "Atualize o resumo atual com as novas mensagens. Preserve o que importa para continuar "
+    "o atendimento: nome, cidade e tipo de obra do cliente, produtos e medidas pedidos, "
+    "valores e orçamentos já enviados, objeções, preferências e próximos passos combinados. "
+    "Descarte cumprimentos e conversa sem informação. Escreva em português, em tópicos curtos, "
+    "com no máximo {max_chars} caracteres. Responda apenas com o resumo."
+)
+
+# Máximo de mensagens enviadas ao LLM por atualização do resumo (backlogs longos vão em blocos)
+SUMMARY_CHUNK_MESSAGES = 100
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_transcript(messages: list[dict]) -> str:
+    speaker = {"user": "Cliente", "assistant": settings.agent_name}
+    return "\n".join(f"{speaker.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+def summary_message(summary: str) -> dict:
+    """Mensagem de sistema com o resumo, enviada antes da cauda recente do histórico."""
+    return {
+        "role": "system",
+        "content": (
+            "Resumo da conversa anterior com este cliente (mensagens mais antigas, "
+            f"que não aparecem abaixo):\n{summary}"
+        ),
+    }
+
+
+class ConversationSummarizer:
+    """Conta as mensagens novas por lead e dispara a atualização do resumo fora do turno."""
+
+    def __init__(self):
+        # lead_id → mensagens desde o último resumo disparado (só leads ativos)
+        self._pending = TTLCache(max_items=settings.lead_cache_max_entries, ttl=24 * 3600)
+        self._running: set[str] = set()
+        self.updated = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.summary_every_messages > 0
+
+    def unsummarized(self, history: list[dict], summary_until: str | None) -> list[dict]:
+        """
+        Parte do histórico enviada junto com o resumo: só as mensagens posteriores a
+        `resumo_ate` (o que é anterior já está no resumo). Sem data, a mensagem é mantida.
+        """
+        until = _parse_timestamp(summary_until)
+        if until is None:
+            return history
+        kept = []
+        for message in history:
+            created = _parse_timestamp(message.get("criado_em"))
+            if created is None or created > until:
+                kept.append(message)
+        return kept
+
+    def record_messages(self, lead_id: str, count: int = 1) -> None:
+        """Registra mensagens novas do lead; agenda o resumo ao completar o intervalo."""
+        if not self.enabled:
+            return
+        pending = self._pending.get(lead_id, 0) + count
+        if pending < settings.summary_every_messages or lead_id in self._running:
+            self._pending.set(lead_id, pending)
+            return
+        self._pending.pop(lead_id)
+        self._running.add(lead_id)
+        task = background_jobs.submit("resumo_conversa", self.update_summary, lead_id, attempts=2)
+        task.add_done_callback(lambda _: self._running.discard(lead_id))
+
+    async def update_summary(self, lead_id: str) -> str | None:
+        """
+        Funde o resumo atual com as mensagens que já saíram da cauda recente.
+        O backlog é lido em ordem cronológica, em blocos de até SUMMARY_CHUNK_MESSAGES;
+        resumo_ate avança a cada bloco só até a última mensagem de fato resumida.
+        """
+        lead = await memory.get_lead_by_id(lead_id)
+        if not lead:
+            return None
+        summary = lead.get("resumo") or ""
+        until = lead.get("resumo_ate")
+        tail = settings.summary_tail_messages
+        updated = False
+
+        while True:
+            # Bloco + cauda: o que sobra depois do bloco prova que ele está fora da cauda
+            messages = await memory.get_messages_since(lead_id, until, limit=SUMMARY_CHUNK_MESSAGES + tail)
+            to_summarize = messages[:min(SUMMARY_CHUNK_MESSAGES, len(messages) - tail)]
+            if not to_summarize:
+                break
+
+            new_summary = await self._merge(summary, to_summarize)
+            if not new_summary:
+                break
+            summary, until = new_summary, to_summarize[-1]["criado_em"]
+            await memory.update_lead(lead_id, {"resumo": summary, "resumo_ate": until})
+            updated = True
+            logger.info(
+                f"Resumo do lead {lead_id[:8]} atualizado: +{len(to_summarize)} mensagens | {len(summary)} caracteres"
+            )
+
+        if not updated:
+            self.skipped += 1
+            return None
+        self.updated += 1
+        return summary
+
+    async def _merge(self, summary: str, messages: list[dict]) -> str:
+        """Pede ao LLM o resumo atualizado com as novas mensagens ("" se vier vazio)."""
+        response = await grok_client.chat(
+            messages=[
+                {
+                    "role": "system",
+                    "content": SUMMARY_SYSTEM_PROMPT.format(
+                        agent_name=settings.agent_name,
+                        company_name=settings.company_name,
+                        max_chars=settings.summary_max_chars,
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        f"Resumo atual:\n{summary or '(ainda não há resumo)'}\n\n"
+                        f"Novas mensagens:\n{_format_transcript(messages)}"
+                    ),
+                },
+            ],
+            temperature=0.2,
+        )
+        return (response.choices[0].message.content or "").strip()[:settings.summary_max_chars]
+
+    def stats(self) -> dict:
+        return {
+            "leads_pendentes": len(self._pending),
+            "em_andamento": len(self._running),
+            "atualizados": self.updated,
+            "sem_mudanca": self.skipped,
+        }
+
+
+# Instância global
+conversation_summarizer = ConversationSummarizer()
@@ -2,16 +2,21 @@
 Ferramentas (tools) disponíveis para o agente Ana Laura.
 Definição para function calling do Grok + implementação.
 """
+import asyncio
 import json
+import uuid
 from datetime import datetime, timedelta
 
+from core.background import background_jobs, with_retries
 from core.config import settings
 from core.logger import logger
 from core.exceptions import GoogleSheetsError, PDFGenerationError, EvolutionAPIError
 from integrations.sheets_client import sheets_client
 from integrations.evolution_client import evolution_client
 from agent.memory import memory
-from pdf.generator import pdf_generator
+from db.supabase_client import run_in_db_pool
+from pdf.cache import pdf_cache
+from pdf.render_service import pdf_render_service
 
 
 # ============================================================
@@ -155,7 +160,7 @@ async def _tool_consultar_precos(args: dict) -> str:
     busca = args.get("busca", "")
 
     try:
-        produtos = sheets_client.search_products(busca, limit=15)
+        produtos = await sheets_client.search_products_async(busca, limit=15)
 
         if not produtos:
             return json.dumps({
@@ -191,7 +196,7 @@ async def _tool_gerar_orcamento(args: dict, context: dict) -> str:
         if produto_nome and metragem_raw:
             logger.info(f"Parametros simplificados detectados: produto={produto_nome}, metragem={metragem_raw}")
             # Tenta buscar o produto na planilha
-            resultados = sheets_client.search_products(produto_nome, limit=1)
+            resultados = await sheets_client.search_products_async(produto_nome, limit=1)
             if resultados:
                 p = resultados[0]
                 # Limpa a metragem (remove 'm', 'm2', etc)
@@ -222,36 +227,65 @@ async def _tool_gerar_orcamento(args: dict, context: dict) -> str:
         valor_total = round(sum(i["total"] for i in itens), 2)
         validade = (datetime.now() + timedelta(days=settings.quote_validity_days)).strftime("%d/%m/%Y")
 
-        # Número do orçamento
-        numero = f"ORC-{datetime.now().strftime('%Y%m%d%H%M')}"
-
-        # Gera PDF
-        pdf_bytes = pdf_generator.generate(
-            numero=numero,
+        # Orçamento idêntico (mesmo lead, cliente, itens, total, validade e observações) já
+        # gerado: reaproveita o PDF e a URL publicada, sem renderizar nem enviar de novo.
+        # O lead entra na chave: o número impresso no PDF é de um único lead.
+        cache_key = pdf_cache.key_for(
+            lead_id=lead_id,
             nome_cliente=nome_cliente,
             itens=itens,
             valor_total=valor_total,
             validade=validade,
             observacoes=observacoes,
         )
+        cached = pdf_cache.get(cache_key)
+        if cached:
+            numero = cached["numero"]
+            pdf_url = cached["pdf_url"]
+            if not pdf_url:
+                cached_bytes = await asyncio.to_thread(pdf_cache.path_for(cache_key).read_bytes)
+                pdf_url = await _publish_pdf(cache_key, cached_bytes, numero)
+            logger.info(f"PDF reaproveitado do cache: {numero}")
+        else:
+            # Número do orçamento: único, impresso no PDF e usado como chave no banco
+            numero = f"ORC-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
+
+            # Gera PDF (pool de processos, fora do event loop)
+            pdf_bytes = await pdf_render_service.render(
+                numero=numero,
+                nome_cliente=nome_cliente,
+                itens=itens,
+                valor_total=valor_total,
+                validade=validade,
+                observacoes=observacoes,
+            )
+            pdf_cache.put(cache_key, pdf_bytes, numero)
 
-        # Upload para Supabase Storage
-        pdf_url = _upload_pdf_supabase(pdf_bytes, f"{numero}.pdf")
+            # Publica (a URL é o que o resultado da tool precisa)
+            pdf_url = await _publish_pdf(cache_key, pdf_bytes, numero)
 
-        # Salva no banco
+        # Daqui em diante nada bloqueia o resultado: persistência, entrega ao cliente e
+        # notificação ao gestor rodam em background, independentes entre si, com retentativas
         if lead_id:
-            memory.save_orcamento(
+            context["has_orcamento"] = True
+            context["last_orcamento"] = {"valor_total": valor_total, "pdf_url": pdf_url}
+            if phone:
+                memory.record_pending_quote(phone, valor_total, pdf_url)
+            background_jobs.submit(
+                f"salvar_orcamento {numero}",
+                memory.save_orcamento,
                 lead_id=lead_id,
+                numero=numero,
                 itens=itens,
                 valor_total=valor_total,
                 pdf_url=pdf_url,
                 observacoes=observacoes,
             )
-            memory.update_lead(lead_id, {"status": "orcamento_enviado"})
 
-        # Envia PDF ao cliente
         if phone and pdf_url:
-            await evolution_client.send_document_url(
+            background_jobs.submit(
+                "enviar_orcamento_cliente",
+                evolution_client.send_document_url,
                 phone=phone,
                 url_doc=pdf_url,
                 caption=f"📄 Orçamento {numero} - {settings.company_name}",
@@ -260,20 +294,18 @@ async def _tool_gerar_orcamento(args: dict, context: dict) -> str:
 
         # Notifica o gestor automaticamente após o orçamento ser gerado
         if settings.manager_phone:
-            try:
-                resumo = f"Orçamento {numero} gerado.\nItens: {', '.join(i.get('descricao', '') for i in itens)}"
-                await _tool_notificar_gestor(
-                    args={
-                        "nome_cliente": nome_cliente,
-                        "telefone_cliente": phone or "",
-                        "resumo_interesse": resumo,
-                        "valor_orcamento": valor_total,
-                        "pdf_url": pdf_url,
-                    },
-                    context=context,
-                )
-            except Exception as e:
-                logger.warning(f"Notificação ao gestor falhou (não crítico): {e}")
+            resumo = f"Orçamento {numero} gerado.\nItens: {', '.join(i.get('produto', '') for i in itens)}"
+            background_jobs.submit(
+                "notificar_gestor",
+                _send_manager_notification,
+                nome=nome_cliente,
+                telefone=phone or "",
+                resumo=resumo,
+                valor=valor_total,
+                pdf_url=pdf_url,
+                step_attempts=3,
+                attempts=1,
+            )
 
         return json.dumps({
             "sucesso": True,
@@ -281,7 +313,10 @@ async def _tool_gerar_orcamento(args: dict, context: dict) -> str:
             "valor_total": valor_total,
             "pdf_url": pdf_url,
             "validade": validade,
-            "mensagem": f"Orçamento {numero} gerado e enviado com sucesso! Total: R$ {valor_total:,.2f}",
+            "mensagem": (
+                f"Orçamento {numero} gerado. Total: R$ {valor_total:,.2f}. "
+                "O PDF está sendo enviado ao cliente (envio em andamento)."
+            ),
         }, ensure_ascii=False)
 
     except Exception as e:
@@ -301,52 +336,88 @@ async def _tool_notificar_gestor(args: dict, context: dict) -> str:
     pdf_url = args.get("pdf_url", "")
     lead_id = context.get("lead_id")
 
-    # Se dados do orçamento não vieram, tenta buscar o último gerado no banco
+    # Se dados do orçamento não vieram, usa o último orçamento do lead
+    # (já carregado no contexto do turno; o banco só é consultado sem contexto)
     if (not valor or not pdf_url) and lead_id:
-        orcamento = memory.get_last_orcamento(lead_id)
+        orcamento = context.get("last_orcamento")
+        if orcamento is None and context.get("has_orcamento") is not False:
+            orcamento = await memory.get_last_orcamento(lead_id)
         if orcamento:
             if not valor:
                 valor = orcamento.get("valor_total", 0)
             if not pdf_url:
                 pdf_url = orcamento.get("pdf_url", "")
-            logger.info("Dados do orçamento recuperados do banco para notificação.")
+            logger.info("Dados do último orçamento recuperados para notificação.")
 
     try:
-        valor_str = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if valor > 0 else "Não gerado ainda"
-
-        mensagem = (
-            f"🔔 *NOVO LEAD QUENTE!*\n\n"
-            f"👤 *Cliente:* {nome}\n"
-            f"📱 *Telefone:* {telefone}\n"
-            f"💰 *Valor orçado:* {valor_str}\n\n"
-            f"📋 *Interesse:*\n{resumo}\n\n"
-        )
+        await _send_manager_notification(nome, telefone, resumo, valor, pdf_url)
+        logger.info(f"Gestor notificado sobre lead: {nome}")
+        return json.dumps({"sucesso": True, "mensagem": "Gestor notificado com sucesso."})
 
-        if pdf_url:
-            mensagem += f"📄 *PDF:* {pdf_url}\n\n"
+    except EvolutionAPIError as e:
+        logger.error(f"Erro ao notificar gestor: {e}")
+        return json.dumps({"erro": f"Falha ao notificar gestor: {str(e)}"})
 
-        mensagem += f"_Atendido pela {settings.agent_name} • {datetime.now().strftime('%d/%m/%Y %H:%M')}_"
 
-        await evolution_client.send_text(
+async def _send_manager_notification(
+    nome: str,
+    telefone: str,
+    resumo: str,
+    valor: float,
+    pdf_url: str,
+    step_attempts: int = 1,
+) -> None:
+    """Envia ao gestor o resumo do lead e, se houver, o PDF (cada envio com suas retentativas)."""
+    valor_str = f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if valor > 0 else "Não gerado ainda"
+
+    mensagem = (
+        f"🔔 *NOVO LEAD QUENTE!*\n\n"
+        f"👤 *Cliente:* {nome}\n"
+        f"📱 *Telefone:* {telefone}\n"
+        f"💰 *Valor orçado:* {valor_str}\n\n"
+        f"📋 *Interesse:*\n{resumo}\n\n"
+    )
+
+    if pdf_url:
+        mensagem += f"📄 *PDF:* {pdf_url}\n\n"
+
+    mensagem += f"_Atendido pela {settings.agent_name} • {datetime.now().strftime('%d/%m/%Y %H:%M')}_"
+
+    await with_retries(
+        evolution_client.send_text,
+        phone=settings.manager_phone,
+        message=mensagem,
+        attempts=step_attempts,
+    )
+
+    # Envia PDF também para o gestor se disponível
+    if pdf_url:
+        await with_retries(
+            evolution_client.send_document_url,
             phone=settings.manager_phone,
-            message=mensagem,
+            url_doc=pdf_url,
+            caption=f"Orçamento do cliente {nome}",
+            filename=f"Orcamento_{nome.replace(' ', '_')}.pdf",
+            attempts=step_attempts,
         )
 
-        # Envia PDF também para o gestor se disponível
-        if pdf_url:
-            await evolution_client.send_document_url(
-                phone=settings.manager_phone,
-                url_doc=pdf_url,
-                caption=f"Orçamento do cliente {nome}",
-                filename=f"Orcamento_{nome.replace(' ', '_')}.pdf",
-            )
-
-        logger.info(f"Gestor notificado sobre lead: {nome}")
-        return json.dumps({"sucesso": True, "mensagem": "Gestor notificado com sucesso."})
 
-    except EvolutionAPIError as e:
-        logger.error(f"Erro ao notificar gestor: {e}")
-        return json.dumps({"erro": f"Falha ao notificar gestor: {str(e)}"})
+async def _publish_pdf(cache_key: str, pdf_bytes: bytes, numero: str) -> str:
+    """
+    Publica o PDF e retorna a URL de entrega ("" se nenhuma origem estiver disponível).
+    PDF_SOURCE=storage: Supabase Storage, com a rota local /pdfs como fallback;
+    PDF_SOURCE=local: apenas a rota local (exige PDF_PUBLIC_BASE_URL).
+    """
+    pdf_url = ""
+    if settings.pdf_source == "storage":
+        pdf_url = await run_in_db_pool(_upload_pdf_supabase, pdf_bytes, f"{numero}-{cache_key[:12]}.pdf")
+    if not pdf_url and settings.pdf_public_base_url:
+        pdf_url = f"{settings.pdf_public_base_url.rstrip('/')}/pdfs/{cache_key}.pdf"
+        # O link local vai para o banco (orçamento e lead): o arquivo não pode ser removido
+        pdf_cache.pin(cache_key)
+    if pdf_url:
+        pdf_cache.set_url(cache_key, pdf_url)
+    return pdf_url
 
 
 def _upload_pdf_supabase(pdf_bytes: bytes, filename: str) -> str:
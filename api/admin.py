@@ -0,0 +1,25 @@
+"""
+Endpoints administrativos (exigem o header X-Admin-Token = ADMIN_TOKEN).
+POST /admin/prompt/reload → recarrega persona + base de conhecimento sem reiniciar
+"""
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException
+
+from agent.persona import prompt_builder
+from core.config import settings
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+def _check_token(token: str | None) -> None:
+    if not settings.admin_token or not token or not secrets.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Acesso negado.")
+
+
+@router.post("/prompt/reload")
+async def reload_prompt(x_admin_token: str | None = Header(default=None)):
+    """Relê o knowledge.md e re-renderiza a parte estática do prompt de sistema."""
+    _check_token(x_admin_token)
+    size = prompt_builder.reload()
+    return {"status": "ok", "bytes_estatico": size}
@@ -1,87 +1,211 @@
 """
 Endpoints para visualização de conversas e leads.
-GET /conversations          → lista todos os leads
-GET /conversations/{lead_id} → histórico completo de mensagens de um lead
+GET /conversations          → lista leads (paginação por cursor, filtro de status)
+GET /conversations/{lead_id} → página do histórico de mensagens de um lead (cursor before/after)
+GET /conversations/{lead_id}/stream → histórico completo em NDJSON, paginado sob demanda
 """
-from fastapi import APIRouter, HTTPException
-from db.supabase_client import supabase
+import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from db.supabase_client import supabase, execute_async
 from core.logger import logger
 
 router = APIRouter(prefix="/conversations", tags=["Conversas"])
 
 
+def _encode_cursor(criado_em: str, lead_id: str) -> str:
+    raw = json.dumps([criado_em, lead_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    (criado_em, lead_id) do cursor. O cursor vem do cliente e entra num filtro do PostgREST:
+    só aceita um timestamp ISO e um UUID, re-serializados (nada do texto original passa adiante).
+    """
+    try:
+        criado_em, lead_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(criado_em).isoformat(), _require_uuid(lead_id, 400, "Cursor inválido.")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def _require_uuid(value: str, status_code: int, detail: str) -> str:
+    """Ids vão para filtros do PostgREST: fora do formato UUID, responde antes de consultar."""
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status_code, detail=detail)
+
+
+def _status_list(status: str | None) -> list[str]:
+    return [s.strip() for s in (status or "").split(",") if s.strip()]
+
+
+async def _count_leads(statuses: list[str]) -> int:
+    """Total de leads via contadores mantidos por trigger (leads_contagem)."""
+    query = supabase.table("leads_contagem").select("status, total")
+    if statuses:
+        query = query.in_("status", statuses)
+    result = await execute_async(query)
+    return sum(row["total"] for row in result.data or [])
+
+
 @router.get("")
-def list_leads():
-    """Lista todos os leads com status e última mensagem."""
+async def list_leads(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Cursor retornado em next_cursor"),
+    status: str | None = Query(None, description="Filtra por status (separados por vírgula)"),
+):
+    """
+    Lista leads com status e última mensagem, do mais recente ao mais antigo.
+    Uma única query na view `leads_com_ultima_mensagem` por página (keyset em criado_em, id).
+    """
     try:
-        result = (
-            supabase.table("leads")
-            .select("id, nome, telefone, status, criado_em")
+        statuses = _status_list(status)
+        query = (
+            supabase.table("leads_com_ultima_mensagem")
+            .select("id, nome, telefone, status, criado_em, ultima_mensagem")
             .order("criado_em", desc=True)
-            .execute()
+            .order("id", desc=True)
+            .limit(limit + 1)
         )
-        leads = result.data or []
-
-        # Para cada lead, busca a última mensagem
-        for lead in leads:
-            last_msg_result = (
-                supabase.table("messages")
-                .select("role, content, criado_em")
-                .eq("lead_id", lead["id"])
-                .order("criado_em", desc=True)
-                .limit(1)
-                .execute()
+        if statuses:
+            query = query.in_("status", statuses)
+        if cursor:
+            criado_em, lead_id = _decode_cursor(cursor)
+            query = query.or_(
+                f'criado_em.lt."{criado_em}",and(criado_em.eq."{criado_em}",id.lt.{lead_id})'
             )
-            if last_msg_result.data:
-                lead["ultima_mensagem"] = last_msg_result.data[0]
-            else:
-                lead["ultima_mensagem"] = None
 
-        return {"total": len(leads), "leads": leads}
+        page_result, total = await asyncio.gather(
+            execute_async(query),
+            _count_leads(statuses),
+        )
+        leads = page_result.data or []
+
+        next_cursor = None
+        if len(leads) > limit:
+            leads = leads[:limit]
+            last = leads[-1]
+            next_cursor = _encode_cursor(last["criado_em"], last["id"])
+
+        return {"total": total, "leads": leads, "next_cursor": next_cursor}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao listar leads: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Página interna usada pelo modo streaming (limita memória por requisição)
+_STREAM_PAGE_SIZE = 500
+
+
+async def _get_lead_or_404(lead_id: str) -> dict:
+    result = await execute_async(
+        supabase.table("leads")
+        .select("*")
+        .eq("id", lead_id)
+    )
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Lead não encontrado.")
+    return result.data[0]
+
+
+async def _message_position(lead_id: str, message_id: str) -> tuple[str, str]:
+    """Retorna (criado_em, id) da mensagem usada como cursor."""
+    result = await execute_async(
+        supabase.table("messages")
+        .select("id, criado_em")
+        .eq("lead_id", lead_id)
+        .eq("id", message_id)
+    )
+    if not result.data:
+        raise HTTPException(status_code=400, detail="Cursor de mensagem inválido.")
+    return result.data[0]["criado_em"], result.data[0]["id"]
+
+
+def _messages_page_query(lead_id: str, limit: int, position: tuple[str, str] | None, older: bool):
+    """
+    Query de uma página de mensagens por keyset em (criado_em, id).
+    older=True → mensagens anteriores à posição (ordem decrescente);
+    older=False → mensagens posteriores (ordem crescente).
+    """
+    query = (
+        supabase.table("messages")
+        .select("id, role, content, criado_em")
+        .eq("lead_id", lead_id)
+        .order("criado_em", desc=older)
+        .order("id", desc=older)
+        .limit(limit)
+    )
+    if position:
+        criado_em, message_id = position
+        op = "lt" if older else "gt"
+        query = query.or_(
+            f'criado_em.{op}."{criado_em}",and(criado_em.eq."{criado_em}",id.{op}.{message_id})'
+        )
+    return query
+
+
 @router.get("/{lead_id}")
-def get_conversation(lead_id: str):
-    """Retorna lead + histórico completo de mensagens."""
+async def get_conversation(
+    lead_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    before: str | None = Query(None, description="Id da mensagem: retorna as anteriores a ela"),
+    after: str | None = Query(None, description="Id da mensagem: retorna as posteriores a ela"),
+):
+    """
+    Retorna lead + uma página do histórico de mensagens (ordem cronológica).
+    Sem cursor, retorna as `limit` mensagens mais recentes.
+    Para o histórico completo sem paginar, use GET /conversations/{lead_id}/stream.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use apenas 'before' ou 'after'.")
+    lead_id = _require_uuid(lead_id, 404, "Lead não encontrado.")
+    if after or before:
+        _require_uuid(after or before, 400, "Cursor de mensagem inválido.")
+
     try:
-        # Busca o lead
-        lead_result = (
-            supabase.table("leads")
-            .select("*")
-            .eq("id", lead_id)
-            .execute()
-        )
-        if not lead_result.data:
-            raise HTTPException(status_code=404, detail="Lead não encontrado.")
+        lead = await _get_lead_or_404(lead_id)
 
-        lead = lead_result.data[0]
+        cursor_id = after or before
+        position = await _message_position(lead_id, cursor_id) if cursor_id else None
+        older = after is None
 
-        # Busca todas as mensagens
-        messages_result = (
-            supabase.table("messages")
-            .select("role, content, criado_em")
-            .eq("lead_id", lead_id)
-            .order("criado_em", desc=False)
-            .execute()
+        # Busca uma mensagem a mais para saber se há outra página
+        messages_result = await execute_async(
+            _messages_page_query(lead_id, limit + 1, position, older=older)
         )
+        mensagens = messages_result.data or []
+        has_more = len(mensagens) > limit
+        mensagens = mensagens[:limit]
+        if older:
+            mensagens.reverse()
 
-        # Busca orçamentos
-        orcamentos_result = (
+        # Busca orçamentos (apenas os mais recentes)
+        orcamentos_result = await execute_async(
             supabase.table("orcamentos")
             .select("valor_total, pdf_url, criado_em")
             .eq("lead_id", lead_id)
-            .order("criado_em", desc=False)
-            .execute()
+            .order("criado_em", desc=True)
+            .limit(50)
         )
 
         return {
             "lead": lead,
-            "mensagens": messages_result.data or [],
-            "orcamentos": orcamentos_result.data or [],
+            "mensagens": mensagens,
+            "orcamentos": list(reversed(orcamentos_result.data or [])),
+            "has_more": has_more,
+            "before": mensagens[0]["id"] if mensagens else None,
+            "after": mensagens[-1]["id"] if mensagens else None,
         }
 
     except HTTPException:
@@ -89,3 +213,56 @@ def get_conversation(lead_id: str):
     except Exception as e:
         logger.error(f"Erro ao buscar conversa {lead_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{lead_id}/stream")
+async def stream_conversation(lead_id: str):
+    """
+    Transmite a conversa completa em NDJSON (uma linha JSON por registro):
+    {"tipo": "lead", ...}, depois {"tipo": "mensagem", ...} em ordem cronológica
+    e por fim {"tipo": "orcamento", ...}. O banco é paginado sob demanda.
+    """
+    lead_id = _require_uuid(lead_id, 404, "Lead não encontrado.")
+    try:
+        lead = await _get_lead_or_404(lead_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao buscar conversa {lead_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def generate():
+        yield json.dumps({"tipo": "lead", **lead}, ensure_ascii=False, default=str) + "\n"
+
+        position = None
+        while True:
+            try:
+                page = await execute_async(
+                    _messages_page_query(lead_id, _STREAM_PAGE_SIZE, position, older=False)
+                )
+            except Exception as e:
+                logger.error(f"Erro ao transmitir conversa {lead_id}: {e}")
+                yield json.dumps({"tipo": "erro", "detalhe": str(e)}, ensure_ascii=False) + "\n"
+                return
+            rows = page.data or []
+            for row in rows:
+                yield json.dumps({"tipo": "mensagem", **row}, ensure_ascii=False, default=str) + "\n"
+            if len(rows) < _STREAM_PAGE_SIZE:
+                break
+            position = (rows[-1]["criado_em"], rows[-1]["id"])
+
+        try:
+            orcamentos_result = await execute_async(
+                supabase.table("orcamentos")
+                .select("valor_total, pdf_url, criado_em")
+                .eq("lead_id", lead_id)
+                .order("criado_em", desc=False)
+            )
+        except Exception as e:
+            logger.error(f"Erro ao transmitir orçamentos {lead_id}: {e}")
+            yield json.dumps({"tipo": "erro", "detalhe": str(e)}, ensure_ascii=False) + "\n"
+            return
+        for row in orcamentos_result.data or []:
+            yield json.dumps({"tipo": "orcamento", **row}, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
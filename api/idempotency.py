@@ -0,0 +1,65 @@
+"""
+Idempotência do webhook: descarta reentregas da Evolution API pelo id da mensagem (data.key.id).
+Cache LRU+TTL em memória, opcionalmente respaldado por uma tabela no Supabase.
+"""
+from core.cache import TTLCache
+from core.config import settings
+from core.logger import logger
+
+# Código Postgres para violação de UNIQUE/PRIMARY KEY
+_UNIQUE_VIOLATION = "23505"
+
+
+class MessageDeduplicator:
+    """Registra ids de mensagens já processadas e detecta duplicatas em O(1)."""
+
+    def __init__(self):
+        self._seen = TTLCache(
+            max_items=settings.dedupe_max_entries,
+            ttl=settings.dedupe_ttl_seconds,
+        )
+        self.hits = 0
+        self.misses = 0
+
+    async def is_duplicate(self, message_id: str) -> bool:
+        """Retorna True se a mensagem já foi vista; caso contrário a registra."""
+        if message_id in self._seen:
+            self.hits += 1
+            return True
+
+        # Marca antes de qualquer await: reentregas concorrentes caem no cache
+        self._seen.set(message_id, True)
+
+        if settings.dedupe_persistent and await self._seen_in_store(message_id):
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    async def _seen_in_store(self, message_id: str) -> bool:
+        """Insere o id na tabela persistente; conflito de chave indica duplicata."""
+        from db.supabase_client import supabase, execute_async
+
+        try:
+            await execute_async(
+                supabase.table("webhook_mensagens").insert({"message_id": message_id})
+            )
+            return False
+        except Exception as e:
+            if getattr(e, "code", None) == _UNIQUE_VIOLATION:
+                return True
+            # Store indisponível não bloqueia o atendimento
+            logger.warning(f"Falha ao registrar id de mensagem no Supabase: {e}")
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "ids_em_cache": len(self._seen),
+            "duplicadas": self.hits,
+            "novas": self.misses,
+        }
+
+
+# Instância global
+message_deduplicator = MessageDeduplicator()
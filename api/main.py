@@ -10,6 +10,8 @@ from core.config import settings
 from core.logger import logger
 from api.webhook import router as webhook_router
 from api.conversations import router as conversations_router
+from api.pdfs import router as pdfs_router
+from api.admin import router as admin_router
 
 # Cria pasta de logs se não existir
 os.makedirs("logs", exist_ok=True)
@@ -32,16 +34,49 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️  Supabase não disponível na inicialização: {e}")
 
-    # Pré-carrega planilha no cache
-    try:
-        from integrations.sheets_client import sheets_client
-        products = sheets_client.get_all_products()
-        logger.info(f"✅ Google Sheets: {len(products)} produtos carregados")
-    except Exception as e:
-        logger.warning(f"⚠️  Google Sheets não disponível na inicialização: {e}")
+    # Pré-carrega o catálogo: snapshot local (instantâneo) ou, na falta dele, a planilha
+    from integrations.sheets_client import sheets_client
+    snapshot_count = sheets_client.load_snapshot()
+    if snapshot_count:
+        logger.info(f"✅ Catálogo: {snapshot_count} produtos carregados do snapshot local")
+    else:
+        try:
+            products = await sheets_client.get_all_products_async()
+            logger.info(f"✅ Google Sheets: {len(products)} produtos carregados")
+        except Exception as e:
+            logger.warning(f"⚠️  Google Sheets não disponível na inicialização: {e}")
+
+    # Abre o pool HTTP compartilhado da Evolution API
+    from integrations.evolution_client import evolution_client
+    await evolution_client.start()
+
+    # Entrega dos PDFs: sem PDF_PUBLIC_BASE_URL não há rota local para os links
+    if not settings.pdf_public_base_url:
+        if settings.pdf_source == "local":
+            logger.error("❌ PDF_SOURCE=local exige PDF_PUBLIC_BASE_URL: orçamentos ficarão sem link de PDF")
+        else:
+            logger.warning("⚠️  PDF_PUBLIC_BASE_URL vazio: se o Supabase Storage falhar, o orçamento fica sem link de PDF")
+
+    # Sobe e aquece os processos de renderização de PDF
+    from pdf.render_service import pdf_render_service
+    await pdf_render_service.start()
 
     logger.info(f"🚀 API pronta na porta {settings.port}")
     yield
+
+    from agent.dispatcher import lead_dispatcher
+    await lead_dispatcher.aclose()
+
+    from core.background import background_jobs
+    await background_jobs.aclose()
+
+    from integrations.outbound_dispatcher import outbound_dispatcher
+    await outbound_dispatcher.aclose()
+    await evolution_client.aclose()
+    await pdf_render_service.aclose()
+
+    from integrations.grok_client import grok_client
+    await grok_client.aclose()
     logger.info("SDR Agent encerrado.")
 
 
@@ -63,6 +98,8 @@ app.add_middleware(
 
 app.include_router(webhook_router, tags=["Webhook"])
 app.include_router(conversations_router)
+app.include_router(pdfs_router)
+app.include_router(admin_router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,31 @@
+"""
+Entrega dos PDFs de orçamento a partir do cache local (pdf/cache.py).
+GET /pdfs/{chave}.pdf → arquivo imutável (a chave é o hash do conteúdo), com ETag e Cache-Control
+"""
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from pdf.cache import pdf_cache
+
+router = APIRouter(prefix="/pdfs", tags=["PDFs"])
+
+# O conteúdo de uma chave nunca muda: pode ficar em cache por um ano
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{key}.pdf")
+async def get_pdf(key: str, request: Request):
+    """Serve o PDF do orçamento armazenado sob a chave de conteúdo."""
+    if not pdf_cache.is_valid_key(key):
+        raise HTTPException(status_code=404, detail="PDF não encontrado.")
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    path = pdf_cache.path_for(key)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="PDF não encontrado.")
+
+    return FileResponse(path, media_type="application/pdf", headers=headers)
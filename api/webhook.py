@@ -1,13 +1,25 @@
 """
 Webhook FastAPI para receber mensagens da Evolution API.
 """
-import asyncio
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
 
 from core.logger import logger
 from core.config import settings
-from agent.sdr_agent import sdr_agent
+from core.background import background_jobs
+from agent.dispatcher import lead_dispatcher
+from agent.memory import memory
+from agent.persona import prompt_builder
+from agent.context_window import context_window
+from agent.summarizer import conversation_summarizer
+from agent.fast_path import fast_path
+from integrations.evolution_client import evolution_client
+from integrations.grok_client import grok_client
+from integrations.outbound_dispatcher import outbound_dispatcher
+from integrations.sheets_client import sheets_client
+from api.idempotency import message_deduplicator
+from pdf.cache import pdf_cache
+from pdf.render_service import pdf_render_service
 
 
 router = APIRouter()
@@ -59,20 +71,14 @@ def _extract_message_data(payload: dict) -> tuple[str | None, str | None, str |
         return None, None, None
 
 
-async def _process_in_background(phone: str, message: str, sender_name: str | None):
-    """Processa a mensagem em background (não bloqueia o webhook)."""
-    try:
-        await sdr_agent.process_message(
-            phone=phone,
-            message=message,
-            sender_name=sender_name,
-        )
-    except Exception as e:
-        logger.exception(f"Erro crítico no background process: {e}")
+def _extract_message_id(payload: dict) -> str | None:
+    """Extrai o id único da mensagem (data.key.id) usado para idempotência."""
+    data = payload.get("data") or {}
+    return (data.get("key") or {}).get("id")
 
 
 @router.post("/webhook/evolution")
-async def webhook_handler(request: Request, background_tasks: BackgroundTasks):
+async def webhook_handler(request: Request):
     """
     Endpoint principal do webhook.
     Recebe eventos da Evolution API e processa de forma assíncrona.
@@ -101,12 +107,16 @@ async def webhook_handler(request: Request, background_tasks: BackgroundTasks):
         logger.debug("Mídia sem texto ignorada")
         return {"status": "ignored", "reason": "media_only"}
 
+    # Descarta reentregas da Evolution API antes de qualquer acesso a banco/LLM
+    message_id = _extract_message_id(payload)
+    if message_id and await message_deduplicator.is_duplicate(message_id):
+        logger.info(f"Mensagem duplicada ignorada: {message_id}")
+        return {"status": "ignored", "reason": "duplicate"}
+
     logger.info(f"Mensagem recebida de {phone[:8]}*** | {message[:50]}...")
 
-    # Processa em background para responder rapidamente ao Evolution
-    background_tasks.add_task(
-        _process_in_background, phone, message, sender_name
-    )
+    # Enfileira no worker do lead (ordem garantida + agrupamento de rajadas)
+    lead_dispatcher.submit(phone, message, sender_name)
 
     return {"status": "received", "phone": phone[:8] + "***"}
 
@@ -119,3 +129,24 @@ async def health_check():
         "agent": settings.agent_name,
         "company": settings.company_name,
     }
+
+
+@router.get("/metrics")
+async def metrics():
+    """Métricas internas de filas e caches."""
+    return {
+        "dedupe": message_deduplicator.stats(),
+        "fila_leads": lead_dispatcher.stats(),
+        "evolution_pool": evolution_client.pool_stats(),
+        "entregas": outbound_dispatcher.stats(),
+        "memoria": memory.cache_stats(),
+        "catalogo": sheets_client.stats(),
+        "pdf": pdf_render_service.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "jobs": background_jobs.stats(),
+        "prompt": prompt_builder.stats(),
+        "llm": grok_client.stats(),
+        "contexto": context_window.stats(),
+        "resumos": conversation_summarizer.stats(),
+        "respostas_locais": fast_path.stats(),
+    }
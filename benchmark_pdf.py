@@ -0,0 +1,61 @@
+"""
+Benchmark de geração de PDF de orçamento (tempo por orçamento, no processo atual).
+Uso: python benchmark_pdf.py [repetições]
+"""
+import statistics
+import sys
+import time
+
+from pdf.generator import pdf_generator
+
+
+def _itens(n: int) -> list[dict]:
+    return [
+        {
+            "produto": f"Telha Galvalume TR25 0,43mm - corte {i + 1}",
+            "unidade": "M",
+            "quantidade": 2.5 + i,
+            "preco_unitario": 44.13,
+            "total": round((2.5 + i) * 44.13, 2),
+        }
+        for i in range(n)
+    ]
+
+
+def run_benchmark(repeticoes: int = 200):
+    print(f"--- Benchmark PDF ({repeticoes} orçamentos por cenário) ---")
+
+    # Primeira geração fora da medição (imports, fontes, caches do processo)
+    pdf_generator.generate(
+        numero="ORC-AQUECIMENTO", nome_cliente="Cliente", itens=_itens(1),
+        valor_total=0, validade="01/01/2030",
+    )
+
+    for n_itens in (1, 10, 40):
+        itens = _itens(n_itens)
+        valor_total = round(sum(i["total"] for i in itens), 2)
+        tempos = []
+        for k in range(repeticoes):
+            inicio = time.perf_counter()
+            pdf_generator.generate(
+                numero=f"ORC-BENCH-{k}",
+                nome_cliente="João da Silva",
+                itens=itens,
+                valor_total=valor_total,
+                validade="01/01/2030",
+                observacoes="Entrega na obra, descarregar ao lado do caminhão.",
+            )
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        tempos.sort()
+        p95 = tempos[int(len(tempos) * 0.95) - 1]
+        print(
+            f"{n_itens:>3} itens: média {statistics.mean(tempos):6.2f} ms | "
+            f"mediana {statistics.median(tempos):6.2f} ms | p95 {p95:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    from core.logger import logger
+    logger.remove()  # Sem o log "PDF gerado" de cada iteração
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,66 @@
+"""
+Jobs em background com retentativas.
+Etapas que não precisam bloquear o turno do agente (persistência, entregas, notificações)
+rodam como tasks do event loop, com backoff exponencial e métricas.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
+
+from core.logger import logger
+
+
+async def with_retries(fn: Callable[..., Awaitable[Any]], *args, attempts: int = 3, **kwargs) -> Any:
+    """Aguarda fn(*args, **kwargs), repetindo em caso de exceção (backoff exponencial)."""
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(attempts),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        reraise=True,
+    ):
+        with attempt:
+            return await fn(*args, **kwargs)
+
+
+class BackgroundJobs:
+    """Dispara jobs fora do fluxo atual e acompanha os que estão em andamento."""
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self.succeeded = 0
+        self.failed = 0
+
+    def submit(self, name: str, fn: Callable[..., Awaitable[Any]], *args, attempts: int = 3, **kwargs) -> asyncio.Task:
+        """
+        Agenda fn(*args, **kwargs) em background, com até `attempts` tentativas.
+        Use attempts=1 para jobs com várias etapas que fazem as próprias retentativas.
+        """
+        task = asyncio.create_task(self._run(name, fn, args, kwargs, attempts), name=f"job:{name}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, name: str, fn, args: tuple, kwargs: dict, attempts: int) -> None:
+        try:
+            await with_retries(fn, *args, attempts=attempts, **kwargs)
+            self.succeeded += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Job em background '{name}' falhou após {attempts} tentativa(s): {e}")
+
+    def stats(self) -> dict:
+        return {
+            "em_andamento": len(self._tasks),
+            "concluidos": self.succeeded,
+            "falhas": self.failed,
+        }
+
+    async def aclose(self, timeout: float = 30) -> None:
+        """No shutdown, aguarda os jobs em andamento (até o timeout)."""
+        if self._tasks:
+            logger.info(f"Aguardando {len(self._tasks)} jobs em background antes de encerrar...")
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+
+# Instância global
+background_jobs = BackgroundJobs()
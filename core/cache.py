@@ -0,0 +1,80 @@
+"""
+Cache em memória LRU com expiração por TTL e limite opcional de bytes.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class TTLCache:
+    """
+    Cache LRU limitado por quantidade de itens, com TTL opcional.
+    Com `max_bytes` + `sizeof`, também limita o tamanho total estimado dos valores.
+    Todas as operações são O(1). Não é thread-safe (uso dentro do event loop).
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        ttl: float | None = None,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+    ):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._data: OrderedDict[Any, tuple[float, Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and (time.monotonic() - stored_at) > self.ttl
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or self._expired(entry[0]):
+            if entry is not None:
+                self.pop(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        """Insere/atualiza o valor (chame de novo após mutar um valor para recalcular o tamanho)."""
+        self.pop(key)
+        size = self._sizeof(value)
+        self._data[key] = (time.monotonic(), value, size)
+        self._bytes += size
+        while len(self._data) > self.max_items or (
+            self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1
+        ):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self._bytes -= entry[2]
+        return entry[1]
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry[0])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        stats = {"itens": len(self._data), "hits": self.hits, "misses": self.misses}
+        if self.max_bytes is not None:
+            stats["bytes"] = self._bytes
+        return stats
@@ -10,10 +10,14 @@ class Settings(BaseSettings):
     grok_api_key: str = Field(..., env="GROK_API_KEY")
     grok_model: str = Field(default="grok-2-latest", env="GROK_MODEL")
     openrouter_base_url: str | None = Field(default=None, env="OPENROUTER_BASE_URL")
+    grok_max_concurrency: int = Field(default=16, env="GROK_MAX_CONCURRENCY")
+    grok_max_connections: int = Field(default=32, env="GROK_MAX_CONNECTIONS")
+    grok_timeout_seconds: float = Field(default=60, env="GROK_TIMEOUT_SECONDS")
 
     # Supabase
     supabase_url: str = Field(..., env="SUPABASE_URL")
     supabase_service_key: str = Field(..., env="SUPABASE_SERVICE_KEY")
+    supabase_max_concurrency: int = Field(default=16, env="SUPABASE_MAX_CONCURRENCY")
 
     # Google Sheets
     google_sheets_id: str = Field(..., env="GOOGLE_SHEETS_ID")
@@ -23,11 +27,19 @@ class Settings(BaseSettings):
     google_credentials_json: str | None = Field(
         default=None, env="GOOGLE_CREDENTIALS_JSON"
     )
+    catalog_refresh_seconds: int = Field(default=60, env="CATALOG_REFRESH_SECONDS")
+    catalog_snapshot_path: str = Field(
+        default="data/catalog.sqlite3", env="CATALOG_SNAPSHOT_PATH"
+    )
 
     # Evolution API
     evolution_api_url: str = Field(..., env="EVOLUTION_API_URL")
     evolution_api_key: str = Field(..., env="EVOLUTION_API_KEY")
     evolution_instance: str = Field(..., env="EVOLUTION_INSTANCE")
+    evolution_max_connections: int = Field(default=20, env="EVOLUTION_MAX_CONNECTIONS")
+    evolution_max_keepalive: int = Field(default=10, env="EVOLUTION_MAX_KEEPALIVE")
+    evolution_http2: bool = Field(default=False, env="EVOLUTION_HTTP2")
+    outbound_max_concurrency: int = Field(default=50, env="OUTBOUND_MAX_CONCURRENCY")
 
     # Gestor de Vendas
     manager_phone: str = Field(..., env="MANAGER_PHONE")
@@ -42,8 +54,33 @@ class Settings(BaseSettings):
 
     # Configurações do Agente
     webhook_secret: str = Field(default="", env="WEBHOOK_SECRET")
+    admin_token: str = Field(default="", env="ADMIN_TOKEN")
     max_history_messages: int = Field(default=20, env="MAX_HISTORY_MESSAGES")
+    context_max_tokens: int = Field(default=16000, env="CONTEXT_MAX_TOKENS")
+    tool_result_max_chars: int = Field(default=2000, env="TOOL_RESULT_MAX_CHARS")
+    summary_every_messages: int = Field(default=10, env="SUMMARY_EVERY_MESSAGES")
+    summary_tail_messages: int = Field(default=10, env="SUMMARY_TAIL_MESSAGES")
+    summary_max_chars: int = Field(default=1500, env="SUMMARY_MAX_CHARS")
+    fast_path_categories: str = Field(
+        default="saudacao,agradecimento,despedida,emoji", env="FAST_PATH_CATEGORIES"
+    )
+    lead_cache_ttl_seconds: int = Field(default=300, env="LEAD_CACHE_TTL_SECONDS")
+    lead_cache_max_entries: int = Field(default=5000, env="LEAD_CACHE_MAX_ENTRIES")
+    history_cache_max_leads: int = Field(default=2000, env="HISTORY_CACHE_MAX_LEADS")
+    history_cache_max_bytes: int = Field(default=32 * 1024 * 1024, env="HISTORY_CACHE_MAX_BYTES")
+    message_debounce_seconds: float = Field(default=2.5, env="MESSAGE_DEBOUNCE_SECONDS")
+    message_debounce_max_seconds: float = Field(default=10, env="MESSAGE_DEBOUNCE_MAX_SECONDS")
+    dedupe_ttl_seconds: int = Field(default=3600, env="DEDUPE_TTL_SECONDS")
+    dedupe_max_entries: int = Field(default=50000, env="DEDUPE_MAX_ENTRIES")
+    dedupe_persistent: bool = Field(default=False, env="DEDUPE_PERSISTENT")
     quote_validity_days: int = Field(default=7, env="QUOTE_VALIDITY_DAYS")
+    pdf_render_workers: int = Field(default=2, env="PDF_RENDER_WORKERS")
+    pdf_render_queue_size: int = Field(default=16, env="PDF_RENDER_QUEUE_SIZE")
+    pdf_render_timeout_seconds: float = Field(default=30, env="PDF_RENDER_TIMEOUT_SECONDS")
+    pdf_cache_dir: str = Field(default="data/pdfs", env="PDF_CACHE_DIR")
+    pdf_cache_max_bytes: int = Field(default=256 * 1024 * 1024, env="PDF_CACHE_MAX_BYTES")
+    pdf_source: str = Field(default="storage", env="PDF_SOURCE")
+    pdf_public_base_url: str = Field(default="", env="PDF_PUBLIC_BASE_URL")
     port: int = Field(default=8000, env="PORT")
 
     class Config:
@@ -1,6 +1,11 @@
 """
 Cliente Supabase centralizado com retry e tratamento de erros.
+As chamadas (síncronas no supabase-py) são executadas num pool de threads limitado
+para não bloquear o event loop.
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from supabase import create_client, Client
 from core.config import settings
 from core.logger import logger
@@ -22,3 +27,22 @@ def get_supabase_client() -> Client:
 
 # Instância global reutilizável
 supabase: Client = get_supabase_client()
+
+# Pool de threads para I/O do Supabase + semáforo que limita requisições simultâneas
+_executor = ThreadPoolExecutor(
+    max_workers=settings.supabase_max_concurrency,
+    thread_name_prefix="supabase",
+)
+_semaphore = asyncio.Semaphore(settings.supabase_max_concurrency)
+
+
+async def run_in_db_pool(fn, *args, **kwargs):
+    """Executa uma função bloqueante do supabase-py no pool, sem bloquear o event loop."""
+    async with _semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, lambda: fn(*args, **kwargs))
+
+
+async def execute_async(query):
+    """Executa um query builder (`supabase.table(...)...`) de forma assíncrona."""
+    return await run_in_db_pool(query.execute)
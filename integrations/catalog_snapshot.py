@@ -0,0 +1,114 @@
+"""
+Snapshot local do catálogo de produtos (SQLite).
+Guarda os produtos já normalizados e o índice de busca para que o boot não dependa
+do Google Sheets: a carga leva milissegundos e o catálogo continua disponível se a
+planilha estiver fora do ar. Cada gravação gera um arquivo novo que substitui o
+anterior atomicamente (os.replace).
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from core.config import settings
+from core.logger import logger
+from integrations.product_index import ProductIndex
+
+# Incrementar quando o formato das tabelas ou do índice mudar (snapshots antigos são ignorados)
+SNAPSHOT_FORMAT = 1
+
+
+class CatalogSnapshot:
+    """Leitura e gravação atômica do snapshot do catálogo."""
+
+    def __init__(self, path: str):
+        self.path = Path(path) if path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def save(
+        self,
+        products: list[dict],
+        index: ProductIndex,
+        fetched_at: float,
+        revision: str | None = None,
+    ) -> None:
+        """Grava o catálogo num arquivo temporário e o troca pelo snapshot atual."""
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.unlink(missing_ok=True)
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.executescript("""
+                    CREATE TABLE meta (chave TEXT PRIMARY KEY, valor);
+                    CREATE TABLE produtos (
+                        id INTEGER PRIMARY KEY,
+                        produto TEXT NOT NULL,
+                        unidade TEXT NOT NULL,
+                        preco REAL NOT NULL
+                    );
+                """)
+                conn.executemany(
+                    "INSERT INTO produtos (id, produto, unidade, preco) VALUES (?, ?, ?, ?)",
+                    ((i, p["produto"], p["unidade"], p["preco"]) for i, p in enumerate(products)),
+                )
+                conn.executemany("INSERT INTO meta (chave, valor) VALUES (?, ?)", [
+                    ("formato", SNAPSHOT_FORMAT),
+                    ("atualizado_em", fetched_at),
+                    ("revisao", revision),
+                    ("indice", index.to_bytes()),
+                ])
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp_path, self.path)
+            logger.debug(
+                f"Snapshot do catálogo gravado: {len(products)} produtos "
+                f"em {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+        except Exception as e:
+            # O snapshot é só uma otimização: falhar aqui não afeta o cache em memória
+            logger.warning(f"Falha ao gravar snapshot do catálogo em {self.path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def load(self) -> tuple[list[dict], ProductIndex, float, str | None] | None:
+        """
+        Lê o snapshot: (produtos, índice, horário do download, revisão da planilha).
+        Retorna None se não existir, for de outro formato ou estiver corrompido.
+        """
+        if not self.enabled or not self.path.exists():
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT chave, valor FROM meta"))
+                if meta.get("formato") != SNAPSHOT_FORMAT:
+                    logger.info("Snapshot do catálogo em formato antigo; ignorando")
+                    return None
+                products = [
+                    {"produto": produto, "unidade": unidade, "preco": preco}
+                    for produto, unidade, preco in conn.execute(
+                        "SELECT produto, unidade, preco FROM produtos ORDER BY id"
+                    )
+                ]
+            finally:
+                conn.close()
+            try:
+                index = ProductIndex.from_bytes(products, meta["indice"])
+            except Exception as e:
+                logger.warning(f"Índice do snapshot inválido, reconstruindo: {e}")
+                index = ProductIndex(products)
+            return products, index, float(meta["atualizado_em"]), meta.get("revisao")
+        except Exception as e:
+            logger.warning(f"Falha ao ler snapshot do catálogo em {self.path}: {e}")
+            return None
+
+
+# Instância global
+catalog_snapshot = CatalogSnapshot(settings.catalog_snapshot_path)
@@ -2,6 +2,7 @@
 Cliente Evolution API — envio de mensagens, documentos e indicador de digitação.
 """
 import asyncio
+import importlib.util
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
@@ -18,6 +19,65 @@ class EvolutionClient:
             "apikey": settings.evolution_api_key,
             "Content-Type": "application/json",
         }
+        self._client: httpx.AsyncClient | None = None
+        self._in_flight = 0
+        self._requests_total = 0
+
+    # ─── pool HTTP ───────────────────────────────────────────
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartilhado (keep-alive) criado sob demanda."""
+        if self._client is None or self._client.is_closed:
+            http2 = settings.evolution_http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("EVOLUTION_HTTP2 ativo, mas o pacote 'h2' não está instalado. Usando HTTP/1.1.")
+                http2 = False
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=30,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.evolution_max_connections,
+                    max_keepalive_connections=settings.evolution_max_keepalive,
+                    keepalive_expiry=30,
+                ),
+            )
+        return self._client
+
+    async def start(self):
+        """Abre o pool HTTP (chamado no startup da aplicação)."""
+        self._get_client()
+        logger.info(f"Pool HTTP Evolution aberto (max {settings.evolution_max_connections} conexões)")
+
+    async def aclose(self):
+        """Fecha o pool HTTP (chamado no shutdown da aplicação)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, url: str, payload: dict, timeout: float) -> httpx.Response:
+        client = self._get_client()
+        self._in_flight += 1
+        self._requests_total += 1
+        try:
+            return await client.post(url, json=payload, timeout=timeout)
+        finally:
+            self._in_flight -= 1
+
+    def pool_stats(self) -> dict:
+        """Métricas do pool para identificar saturação sob carga."""
+        stats = {
+            "max_conexoes": settings.evolution_max_connections,
+            "requisicoes_em_andamento": self._in_flight,
+            "requisicoes_total": self._requests_total,
+        }
+        # Detalhes internos do httpcore (melhor esforço — API não pública)
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is not None:
+            connections = list(getattr(pool, "connections", []))
+            stats["conexoes_abertas"] = len(connections)
+            stats["conexoes_ociosas"] = sum(1 for c in connections if c.is_idle())
+            stats["requisicoes_aguardando_conexao"] = len(getattr(pool, "_requests", []))
+        return stats
 
     @retry(
         stop=stop_after_attempt(3),
@@ -33,11 +93,10 @@ class EvolutionClient:
             "text": message,
         }
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-                logger.info(f"Mensagem enviada para {phone[:8]}***")
-                return response.json()
+            response = await self._post(url, payload, timeout=30)
+            response.raise_for_status()
+            logger.info(f"Mensagem enviada para {phone[:8]}***")
+            return response.json()
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro HTTP Evolution API [{e.response.status_code}]: {e.response.text}")
             raise EvolutionAPIError(f"Erro HTTP {e.response.status_code}: {e.response.text}")
@@ -63,11 +122,10 @@ class EvolutionClient:
             "fileName": filename,
         }
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-                logger.info(f"Documento enviado para {phone[:8]}***")
-                return response.json()
+            response = await self._post(url, payload, timeout=60)
+            response.raise_for_status()
+            logger.info(f"Documento enviado para {phone[:8]}***")
+            return response.json()
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro ao enviar documento [{e.response.status_code}]: {e.response.text}")
             raise EvolutionAPIError(f"Erro HTTP {e.response.status_code}: {e.response.text}")
@@ -83,20 +141,23 @@ class EvolutionClient:
             },
         }
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                await client.post(url, json=payload, headers=self.headers)
+            await self._post(url, payload, timeout=10)
         except Exception as e:
             # Não crítico — só loga e continua
             logger.debug(f"Falha ao enviar typing indicator: {e}")
 
+    @staticmethod
+    def humanized_delay_ms(message: str) -> int:
+        """Delay de digitação proporcional ao tamanho da mensagem (mínimo 1s, máximo 4s)."""
+        return min(max(len(message) * 30, 1000), 4000)
+
     async def send_message_humanized(self, phone: str, message: str):
         """
         Envia mensagem com simulação de digitação proporcional ao tamanho da mensagem.
         Torna a conversa mais natural e humana.
+        Bloqueia até a entrega; no fluxo do agente use o outbound_dispatcher.
         """
-        # Calcula delay baseado no tamanho (mínimo 1s, máximo 4s)
-        char_count = len(message)
-        delay_ms = min(max(char_count * 30, 1000), 4000)
+        delay_ms = self.humanized_delay_ms(message)
 
         await self.send_typing(phone, delay_ms)
         await asyncio.sleep(delay_ms / 1000)
@@ -1,7 +1,11 @@
 """
 Cliente para a Grok AI (xAI) — compatível com OpenAI SDK.
+Usa o cliente assíncrono com pool HTTP compartilhado para não bloquear o event loop.
 """
-from openai import OpenAI
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from core.config import settings
 from core.logger import logger
@@ -15,12 +19,28 @@ class GrokClient:
     def __init__(self):
         # Prioriza a URL do OpenRouter se definida no .env, senão usa xAI
         base_url = settings.openrouter_base_url or self.DEFAULT_BASE_URL
-        
-        self.client = OpenAI(
+
+        # Pool HTTP único (keep-alive) compartilhado por todas as conversas
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.grok_max_connections,
+                max_keepalive_connections=settings.grok_max_connections,
+            ),
+            timeout=httpx.Timeout(settings.grok_timeout_seconds, connect=10),
+        )
+        self.client = AsyncOpenAI(
             api_key=settings.grok_api_key,
             base_url=base_url,
+            http_client=self._http_client,
         )
         self.model = settings.grok_model
+        # Limita chamadas simultâneas ao LLM (protege rate limit do provedor)
+        self._semaphore = asyncio.Semaphore(settings.grok_max_concurrency)
+        # Uso de tokens (prompt_tokens_details.cached_tokens = prefixo servido do cache do provedor)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
 
     @retry(
         stop=stop_after_attempt(3),
@@ -28,11 +48,13 @@ class GrokClient:
         retry=retry_if_exception_type(Exception),
         reraise=True,
     )
-    def chat(
+    async def chat(
         self,
         messages: list[dict],
         tools: list[dict] | None = None,
         tool_choice: str = "auto",
+        timeout: float | None = None,
+        temperature: float = 0.85,
     ) -> dict:
         """
         Envia mensagens para o Grok e retorna a resposta completa.
@@ -42,15 +64,18 @@ class GrokClient:
             kwargs = {
                 "model": self.model,
                 "messages": messages,
-                "temperature": 0.85,       # Um pouco de criatividade para parecer humano
+                "temperature": temperature,  # Padrão com um pouco de criatividade para parecer humano
                 "max_tokens": 1024,
+                "timeout": timeout or settings.grok_timeout_seconds,
             }
             if tools:
                 kwargs["tools"] = tools
                 kwargs["tool_choice"] = tool_choice
 
             logger.debug(f"Chamando Grok com {len(messages)} mensagens no histórico")
-            response = self.client.chat.completions.create(**kwargs)
+            async with self._semaphore:
+                response = await self.client.chat.completions.create(**kwargs)
+            self._record_usage(response)
             logger.debug(f"Grok respondeu: finish_reason={response.choices[0].finish_reason}")
             return response
 
@@ -58,6 +83,33 @@ class GrokClient:
             logger.error(f"Erro na Grok API: {e}")
             raise GrokAPIError(f"Falha na comunicação com Grok: {e}")
 
+    def _record_usage(self, response) -> None:
+        """Acumula tokens de prompt, de prompt em cache e de resposta."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        prompt_tokens = usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached
+        self.completion_tokens += usage.completion_tokens or 0
+        logger.debug(f"Grok uso: prompt={prompt_tokens} (cache={cached}) | resposta={usage.completion_tokens}")
+
+    def stats(self) -> dict:
+        return {
+            "chamadas": self.calls,
+            "tokens_prompt": self.prompt_tokens,
+            "tokens_prompt_cache": self.cached_tokens,
+            "tokens_resposta": self.completion_tokens,
+            "taxa_cache": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+
+    async def aclose(self):
+        """Fecha o pool HTTP (chamado no shutdown da aplicação)."""
+        await self.client.close()
+
 
 # Instância global
 grok_client = GrokClient()
@@ -0,0 +1,123 @@
+"""
+Despachante de mensagens de saída com entrega humanizada agendada.
+Em vez de dormir dentro do turno do agente, agenda "digitando..." e o texto num heap
+por horário de entrega; um único loop de timer dispara os envios na hora certa.
+"""
+import asyncio
+import heapq
+import itertools
+
+from core.config import settings
+from core.logger import logger
+from integrations.evolution_client import evolution_client
+
+
+class OutboundDispatcher:
+    """Agenda eventos de envio (presença e texto) e os entrega em ordem por telefone."""
+
+    def __init__(self):
+        # (horário, seq, tipo, telefone, dados) — seq desempata e mantém FIFO
+        self._heap: list[tuple[float, int, str, str, dict]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        # Último horário agendado por telefone (mensagens do mesmo lead não se sobrepõem)
+        self._last_due: dict[str, float] = {}
+        # Última entrega em andamento por telefone (encadeia envios do mesmo lead)
+        self._chains: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(settings.outbound_max_concurrency)
+        self.sent = 0
+        self.failed = 0
+
+    def schedule_humanized(self, phone: str, message: str) -> None:
+        """
+        Agenda o indicador de digitação agora e o texto após o delay humanizado.
+        Retorna imediatamente; o turno do agente não espera a entrega.
+        """
+        loop = asyncio.get_running_loop()
+        delay_ms = evolution_client.humanized_delay_ms(message)
+
+        start = max(loop.time(), self._last_due.get(phone, 0.0))
+        due = start + delay_ms / 1000
+        self._push(start, "typing", phone, {"duration_ms": delay_ms})
+        self._push(due, "text", phone, {"message": message})
+        self._last_due[phone] = due
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def _push(self, due: float, kind: str, phone: str, data: dict) -> None:
+        heapq.heappush(self._heap, (due, next(self._seq), kind, phone, data))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Loop do timer: dorme até o próximo evento vencer (ou um novo ser agendado)."""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, _, kind, phone, data = heapq.heappop(self._heap)
+            if kind == "text" and self._last_due.get(phone) == due:
+                del self._last_due[phone]
+            self._launch(kind, phone, data)
+
+    def _launch(self, kind: str, phone: str, data: dict) -> None:
+        previous = self._chains.get(phone)
+        task = asyncio.create_task(self._deliver(kind, phone, data, previous))
+        self._chains[phone] = task
+        task.add_done_callback(lambda t: self._chains.pop(phone, None) if self._chains.get(phone) is t else None)
+
+    async def _deliver(self, kind: str, phone: str, data: dict, previous: asyncio.Task | None) -> None:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+
+        async with self._semaphore:
+            if kind == "typing":
+                await evolution_client.send_typing(phone, data["duration_ms"])
+                return
+            try:
+                await evolution_client.send_text(phone, data["message"])
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Falha na entrega agendada para {phone[:8]}***: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "eventos_agendados": len(self._heap),
+            "entregas_em_andamento": len(self._chains),
+            "enviadas": self.sent,
+            "falhas": self.failed,
+        }
+
+    async def aclose(self, timeout: float = 30) -> None:
+        """No shutdown, entrega imediatamente os textos pendentes (sem o delay)."""
+        if self._runner is not None:
+            self._runner.cancel()
+
+        pending = sorted(self._heap)
+        self._heap.clear()
+        self._last_due.clear()
+        for _, _, kind, phone, data in pending:
+            if kind == "text":
+                self._launch(kind, phone, data)
+
+        chains = list(self._chains.values())
+        if chains:
+            logger.info(f"Entregando {len(chains)} mensagens pendentes antes de encerrar...")
+            await asyncio.wait(chains, timeout=timeout)
+
+
+# Instância global
+outbound_dispatcher = OutboundDispatcher()
@@ -0,0 +1,272 @@
+"""
+Índice de busca do catálogo de produtos.
+Normaliza nomes (acentos, caixa, números e unidades), monta um índice invertido e
+ranqueia com BM25, com expansão por prefixo e por trigramas para erros de digitação.
+"""
+import copy
+import heapq
+import math
+import pickle
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+# Parâmetros BM25
+_K1 = 1.2
+_B = 0.75
+
+# Peso de termos expandidos (não exatos) e limites da expansão
+_PREFIX_WEIGHT = 0.8
+_FUZZY_WEIGHT = 0.7
+_FUZZY_MIN_SIMILARITY = 0.45
+_MAX_EXPANSIONS = 20
+
+# Termos presentes em mais que esta fração do catálogo (e em mais de _BROAD_TERM_MIN_DOCS
+# produtos) não abrem candidatos sozinhos
+_BROAD_TERM_FRACTION = 0.1
+_BROAD_TERM_MIN_DOCS = 500
+
+_STOPWORDS = {"de", "da", "do", "das", "dos", "e", "em", "para", "com", "a", "o", "p"}
+
+# Sinônimos de unidades/abreviações comuns na planilha e nas mensagens
+_UNIT_ALIASES = {
+    "metro": "m", "metros": "m", "mt": "m", "mts": "m", "mtr": "m",
+    "milimetro": "mm", "milimetros": "mm",
+    "centimetro": "cm", "centimetros": "cm",
+    "quilo": "kg", "quilos": "kg", "kilo": "kg", "kilos": "kg",
+    "unidade": "un", "unidades": "un", "und": "un", "unid": "un",
+    "peca": "pc", "pecas": "pc", "pca": "pc",
+}
+
+_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+_COMPOUND_RE = re.compile(r"\b[a-z]+\d+\b|\b\d+[a-z]+\b")
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos, vírgula decimal → ponto, m²/m³ → m2/m3."""
+    text = text.replace("²", "2").replace("³", "3")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _DECIMAL_COMMA_RE.sub(".", text)
+    return " ".join(text.split())
+
+
+def _normalize_token(token: str) -> str:
+    if token[0].isdigit():
+        # "0.430" → "0.43", "3.00" → "3", "025" → "25"
+        if "." in token:
+            return token.rstrip("0").rstrip(".")
+        return token.lstrip("0") or "0"
+    token = _UNIT_ALIASES.get(token, token)
+    # Plural simples do português: "telhas" → "telha"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokens normalizados do texto (inclui tokens compostos como 'tr25' e '43mm')."""
+    norm = normalize(text)
+    tokens = [_normalize_token(t) for t in _TOKEN_RE.findall(norm)]
+    tokens += _COMPOUND_RE.findall(norm)
+    return [t for t in tokens if t and t not in _STOPWORDS]
+
+
+def _trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductIndex:
+    """Índice invertido imutável sobre a lista de produtos (construído no carregamento do catálogo)."""
+
+    def __init__(self, products: list[dict], previous: "ProductIndex | None" = None):
+        """
+        Monta o índice. Com `previous` (índice da carga anterior), reaproveita a tokenização
+        dos nomes que não mudaram; só os produtos novos/renomeados são tokenizados.
+        Os pesos BM25 são sempre recalculados (dependem do catálogo inteiro).
+        """
+        self.products = products
+        # Sequência de tokens de cada produto, para os bônus de frase/início
+        self._token_strings: list[str] = []
+        # termo → {doc_id: peso BM25 já calculado (idf × tf normalizado)}
+        self._postings: dict[str, dict[int, float]] = {}
+        # termo → docs ordenados por peso (consultas de um termo só), montado sob demanda
+        self._ranked_postings: dict[str, list[int]] = {}
+
+        known = previous._tokens_by_name() if previous is not None else {}
+        doc_tokens = []
+        for product in products:
+            token_string = known.get(product["produto"])
+            if token_string is None:
+                token_string = " ".join(tokenize(product["produto"]))
+            self._token_strings.append(token_string)
+            doc_tokens.append(token_string.split())
+
+        n_docs = len(products)
+        avg_len = (sum(len(t) for t in doc_tokens) / n_docs) if n_docs else 1.0
+        term_freqs: dict[str, dict[int, int]] = {}
+        for doc_id, tokens in enumerate(doc_tokens):
+            for token, tf in Counter(tokens).items():
+                term_freqs.setdefault(token, {})[doc_id] = tf
+
+        for token, docs in term_freqs.items():
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._postings[token] = {
+                doc_id: idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * len(doc_tokens[doc_id]) / avg_len))
+                for doc_id, tf in docs.items()
+            }
+
+        self._vocab = sorted(self._postings)
+        if previous is not None and previous._vocab == self._vocab:
+            # Vocabulário igual: o índice de trigramas (somente leitura) é compartilhado
+            self._trigram_index = previous._trigram_index
+        else:
+            self._trigram_index = self._build_trigram_index(self._vocab)
+
+    @staticmethod
+    def _build_trigram_index(vocab: list[str]) -> dict[str, set[str]]:
+        trigram_index: dict[str, set[str]] = {}
+        for token in vocab:
+            if not token[0].isdigit():
+                for tri in _trigrams(token):
+                    trigram_index.setdefault(tri, set()).add(token)
+        return trigram_index
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _tokens_by_name(self) -> dict[str, str]:
+        return {p["produto"]: tokens for p, tokens in zip(self.products, self._token_strings)}
+
+    def with_products(self, products: list[dict]) -> "ProductIndex":
+        """
+        Mesmo índice sobre uma nova lista com os mesmos nomes, na mesma ordem
+        (ex.: só preços/unidades mudaram): nada é re-tokenizado nem re-pontuado.
+        """
+        index = copy.copy(self)
+        index.products = products
+        return index
+
+    # ─── serialização (snapshot local do catálogo) ───────────
+    def to_bytes(self) -> bytes:
+        """Estruturas do índice serializadas, sem os produtos (gravados à parte)."""
+        state = {k: v for k, v in self.__dict__.items() if k not in ("products", "_ranked_postings")}
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, products: list[dict], data: bytes) -> "ProductIndex":
+        """Reconstrói o índice gravado por `to_bytes` sem re-tokenizar o catálogo."""
+        index = cls.__new__(cls)
+        index.__dict__.update(pickle.loads(data))
+        index.products = products
+        index._ranked_postings = {}
+        if len(index._token_strings) != len(products):
+            raise ValueError("Índice serializado não corresponde aos produtos")
+        return index
+
+    # ─── expansão de termos ──────────────────────────────────
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        """Termos do vocabulário que casam com o token da busca, com seus pesos."""
+        if token in self._postings:
+            return [(token, 1.0)]
+        if token[0].isdigit():
+            return []  # Números/medidas só casam exatamente
+
+        # Prefixo: "galva" → "galvalume"
+        matches = []
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token) and len(matches) < _MAX_EXPANSIONS:
+            matches.append((self._vocab[i], _PREFIX_WEIGHT))
+            i += 1
+        if matches or len(token) < 3:
+            return matches
+
+        # Fuzzy por trigramas: "galvalumi" → "galvalume"
+        query_tris = _trigrams(token)
+        shared = Counter()
+        for tri in query_tris:
+            for candidate in self._trigram_index.get(tri, ()):
+                shared[candidate] += 1
+        scored = []
+        for candidate, common in shared.items():
+            similarity = common / (len(query_tris) + len(_trigrams(candidate)) - common)
+            if similarity >= _FUZZY_MIN_SIMILARITY:
+                scored.append((candidate, _FUZZY_WEIGHT * similarity))
+        return heapq.nlargest(3, scored, key=lambda x: x[1])
+
+    # ─── busca ───────────────────────────────────────────────
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Retorna os produtos mais relevantes para a busca.
+        Pontuação BM25, penalizada quando nem todos os termos casam, com bônus quando
+        a busca aparece como frase (ou no início) do nome do produto.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        expansions = [self._expand(t) for t in query_tokens]
+        expansions = [e for e in expansions if e]
+        if not expansions:
+            return []
+
+        phrase = " ".join(query_tokens)
+        if len(expansions) == 1 and len(expansions[0]) == 1:
+            return self._search_single_term(expansions[0][0][0], phrase, limit)
+
+        # Docs que casam com cada termo da busca
+        term_docs = []
+        for expansion in expansions:
+            docs = set()
+            for term, _ in expansion:
+                docs.update(self._postings[term])
+            term_docs.append(docs)
+
+        # Se há resultados suficientes com TODOS os termos, pontua só eles
+        term_docs_sorted = sorted(term_docs, key=len)
+        candidates = term_docs_sorted[0].intersection(*term_docs_sorted[1:])
+        if len(candidates) < limit:
+            # Casamento parcial: candidatos vêm dos termos seletivos; termos muito
+            # comuns ("telha", "m") só contam na pontuação
+            broad = max(_BROAD_TERM_FRACTION * len(self.products), _BROAD_TERM_MIN_DOCS)
+            selective = [docs for docs in term_docs_sorted if len(docs) <= broad] or term_docs_sorted[:1]
+            candidates = set().union(*selective)
+
+        n_terms = len(query_tokens)
+        ranked = []
+        for doc_id in candidates:
+            score = 0.0
+            matched = 0
+            for expansion in expansions:
+                best = 0.0
+                for term, weight in expansion:
+                    w = self._postings[term].get(doc_id)
+                    if w is not None and w * weight > best:
+                        best = w * weight
+                if best:
+                    score += best
+                    matched += 1
+            score *= (matched / n_terms) ** 2
+            ranked.append((score * self._phrase_bonus(doc_id, phrase), -len(self._token_strings[doc_id]), doc_id))
+
+        top = heapq.nlargest(limit, ranked)
+        return [self.products[doc_id] for _, _, doc_id in top]
+
+    def _phrase_bonus(self, doc_id: int, phrase: str) -> float:
+        tokens = self._token_strings[doc_id]
+        if tokens.startswith(phrase):
+            return 2.0
+        return 1.5 if phrase in tokens else 1.0
+
+    def _search_single_term(self, term: str, phrase: str, limit: int) -> list[dict]:
+        """Busca de um termo exato: lista pré-ordenada, custo O(limit)."""
+        ranked = self._ranked_postings.get(term)
+        if ranked is None:
+            postings = self._postings[term]
+            ranked = sorted(
+                postings,
+                key=lambda d: (postings[d] * self._phrase_bonus(d, term), -len(self._token_strings[d])),
+                reverse=True,
+            )
+            self._ranked_postings[term] = ranked
+        return [self.products[doc_id] for doc_id in ranked[:limit]]
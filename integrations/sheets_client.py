@@ -1,9 +1,18 @@
 """
 Cliente Google Sheets — leitura de produtos e preços.
-Cache em memória para evitar chamadas excessivas à API.
+Cache em memória stale-while-revalidate: após o TTL o catálogo antigo continua sendo
+servido enquanto uma única thread em background verifica a revisão da planilha (metadado
+do Drive) e só baixa as linhas se ela mudou; apenas as linhas alteradas são re-processadas.
+No event loop use as variantes *_async: a carga bloqueante (sem cache ou cache velho demais)
+roda numa thread, nunca no loop. A busca usa um índice invertido (integrations.product_index) montado a cada carga do catálogo.
+Cada download bem-sucedido é gravado num snapshot local (integrations.catalog_snapshot), que
+abastece o cache no boot e continua sendo servido enquanto a planilha estiver inacessível.
 """
+import asyncio
 import json
+import threading
 import time
+from datetime import datetime
 from pathlib import Path
 import gspread
 from google.oauth2.service_account import Credentials
@@ -12,6 +21,8 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from core.config import settings
 from core.logger import logger
 from core.exceptions import GoogleSheetsError
+from integrations.catalog_snapshot import catalog_snapshot
+from integrations.product_index import ProductIndex
 
 
 SCOPES = [
@@ -19,14 +30,74 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive.readonly",
 ]
 
-# Cache simples em memória (TTL: 10 minutos)
-_cache: dict = {"data": [], "timestamp": 0}
-CACHE_TTL = 600  # segundos
+# Cache em memória
+_cache: dict = {"data": [], "index": None, "timestamp": 0, "revision": None}
+CACHE_TTL = settings.catalog_refresh_seconds  # após isso, serve o cache e verifica mudanças em background
+CACHE_MAX_STALE = 3600  # segundos — limite rígido: acima disso a atualização é síncrona
+SOURCE_RETRY_AFTER = 60  # segundos — após falha no download, serve o cache sem nova tentativa síncrona
+CHANGED_SKUS_KEPT = 50  # nomes de produtos alterados guardados no resumo do último refresh
+
+
+def _parse_row(row: dict) -> dict | None:
+    """Normaliza uma linha da planilha em {produto, unidade, preco} (None se não houver produto)."""
+    # Normaliza chaves para busca (remove espaços extras das colunas)
+    # Ex: "PRODUTO " vira "PRODUTO"
+    row_normalized = {str(k).strip(): v for k, v in row.items()}
+
+    # Flexível: aceita variações nos nomes das colunas
+    produto = (
+        row_normalized.get("PRODUTO") or row_normalized.get("Produto") or row_normalized.get("produto") or ""
+    ).strip()
+    unidade = (
+        row_normalized.get("UNIDADE") or row_normalized.get("Unidade") or row_normalized.get("unidade") or "UNIDADE"
+    ).strip()
+    preco_raw = (
+        row_normalized.get("PREÇO") or row_normalized.get("Preço") or row_normalized.get("preco") or row_normalized.get("PRECO") or "0"
+    )
+
+    if not produto:
+        return None
+
+    # Limpa o preço: "R$ 44,13" → 44.13
+    preco_str = str(preco_raw).strip()
+    preco_str = preco_str.replace("R$", "").replace(" ", "").replace(".", "").replace(",", ".")
+    try:
+        preco = float(preco_str)
+    except ValueError:
+        preco = 0.0
+
+    return {
+        "produto": produto,
+        "unidade": unidade,
+        "preco": preco,
+    }
+
+
+def _diff_catalog(old: list[dict], new: list[dict]) -> dict[str, list[str]]:
+    """Produtos (pelo nome) adicionados, removidos e com unidade/preço alterados."""
+    old_by_name = {p["produto"]: (p["unidade"], p["preco"]) for p in old}
+    new_by_name = {p["produto"]: (p["unidade"], p["preco"]) for p in new}
+    return {
+        "adicionados": [name for name in new_by_name if name not in old_by_name],
+        "removidos": [name for name in old_by_name if name not in new_by_name],
+        "alterados": [
+            name for name, values in new_by_name.items()
+            if name in old_by_name and old_by_name[name] != values
+        ],
+    }
 
 
 class SheetsClient:
     def __init__(self):
         self._client: gspread.Client | None = None
+        # Garante um único download por vez (single-flight)
+        self._refresh_lock = threading.Lock()
+        self._last_failure = 0.0
+        # Linha bruta da planilha → produto normalizado (só linhas novas/alteradas são re-processadas)
+        self._parsed_rows: dict[tuple, dict | None] = {}
+        self.downloads = 0
+        self.unchanged_checks = 0
+        self.last_changes: dict | None = None
 
     def _get_client(self) -> gspread.Client:
         if self._client is None:
@@ -53,21 +124,156 @@ class SheetsClient:
                 raise GoogleSheetsError(f"Falha na autenticação Google Sheets: {e}")
         return self._client
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        reraise=True,
-    )
     def get_all_products(self) -> list[dict]:
         """
         Retorna todos os produtos da planilha.
         Formato esperado: colunas [PRODUTO, UNIDADE, PREÇO]
+
+        - cache dentro do TTL: retorna direto;
+        - cache vencido (até CACHE_MAX_STALE): retorna o cache e dispara refresh em background;
+        - sem cache ou velho demais: baixa a planilha (chamadas concorrentes compartilham o download);
+          se a planilha estiver inacessível, continua servindo o cache (ou o snapshot local).
+
+        Bloqueante no último caso: no event loop use `get_all_products_async`.
         """
+        products = self._cached_products()
+        return products if products is not None else self.refresh()
+
+    async def get_all_products_async(self) -> list[dict]:
+        """Como get_all_products, mas o download bloqueante (se necessário) roda numa thread."""
+        products = self._cached_products()
+        if products is None:
+            products = await asyncio.to_thread(self.refresh)
+        return products
+
+    def _cached_products(self) -> list[dict] | None:
+        """Catálogo que pode ser servido sem esperar a planilha (None se é preciso baixar)."""
         now = time.time()
-        if _cache["data"] and (now - _cache["timestamp"]) < CACHE_TTL:
+        age = now - _cache["timestamp"]
+        if _cache["data"] and age < CACHE_TTL:
             logger.debug("Retornando produtos do cache")
             return _cache["data"]
 
+        source_down = now - self._last_failure < SOURCE_RETRY_AFTER
+        if _cache["data"] and (age < CACHE_MAX_STALE or source_down):
+            self._refresh_in_background()
+            return _cache["data"]
+
+        return None
+
+    def refresh(self) -> list[dict]:
+        """
+        Atualiza o cache a partir da planilha (single-flight).
+        Quem chega enquanto outro download está em andamento espera e reaproveita o resultado.
+        """
+        requested_at = time.time()
+        with self._refresh_lock:
+            if _cache["data"] and _cache["timestamp"] >= requested_at:
+                return _cache["data"]
+            try:
+                return self._refresh_catalog()
+            except GoogleSheetsError as e:
+                self._last_failure = time.time()
+                if not _cache["data"]:
+                    raise
+                logger.warning(f"Planilha indisponível, servindo catálogo em cache: {e}")
+                return _cache["data"]
+
+    def _refresh_in_background(self):
+        """Dispara o refresh numa thread, se nenhum estiver em andamento."""
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._background_refresh, name="sheets-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # Outro refresh começou nesse meio tempo
+        try:
+            self._refresh_catalog()
+        except Exception as e:
+            self._last_failure = time.time()
+            logger.warning(f"Refresh em background da planilha falhou (servindo cache antigo): {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_catalog(self) -> list[dict]:
+        """
+        Consulta a revisão da planilha (uma chamada leve ao Drive) e só baixa as linhas
+        se ela mudou desde a última carga. Sem revisão disponível, baixa tudo.
+        """
+        revision = self._fetch_revision()
+        if _cache["data"] and revision is not None and revision == _cache["revision"]:
+            _cache["timestamp"] = time.time()
+            self.unchanged_checks += 1
+            logger.debug("Planilha sem alterações desde a última carga")
+            return _cache["data"]
+        return self._store(self._fetch_products(), revision)
+
+    def _fetch_revision(self) -> str | None:
+        """modifiedTime da planilha no Drive (None se não for possível consultar)."""
+        try:
+            metadata = self._get_client().get_file_drive_metadata(settings.google_sheets_id)
+            return metadata["modifiedTime"]
+        except Exception as e:
+            logger.debug(f"Revisão da planilha indisponível, baixando a planilha inteira: {e}")
+            return None
+
+    def _store(self, products: list[dict], revision: str | None = None) -> list[dict]:
+        previous_products, previous_index = _cache["data"], _cache["index"]
+        same_names = previous_index is not None and len(products) == len(previous_products) and all(
+            new["produto"] == old["produto"] for new, old in zip(products, previous_products)
+        )
+        # Índice montado antes da troca: buscas concorrentes usam o catálogo anterior até aqui
+        if same_names:
+            index = previous_index.with_products(products)  # Só preços/unidades mudaram
+        else:
+            index = ProductIndex(products, previous=previous_index)
+        _cache["index"] = index
+        _cache["data"] = products
+        _cache["timestamp"] = time.time()
+        _cache["revision"] = revision
+        if previous_products:
+            self._record_changes(_diff_catalog(previous_products, products))
+        catalog_snapshot.save(products, index, _cache["timestamp"], revision)
+        return products
+
+    def _record_changes(self, changes: dict[str, list[str]]) -> None:
+        changed = changes["adicionados"] + changes["removidos"] + changes["alterados"]
+        self.last_changes = {
+            "em": datetime.now().isoformat(timespec="seconds"),
+            **{kind: len(names) for kind, names in changes.items()},
+            "skus": changed[:CHANGED_SKUS_KEPT],
+        }
+        if changed:
+            logger.info(
+                f"Catálogo atualizado: +{len(changes['adicionados'])} -{len(changes['removidos'])} "
+                f"~{len(changes['alterados'])} produtos ({', '.join(changed[:10])})"
+            )
+
+    def load_snapshot(self) -> int:
+        """
+        Carrega o snapshot local no cache (usado no boot, antes de qualquer acesso à planilha).
+        Se estiver vencido, dispara o refresh em background. Retorna o número de produtos (0 se não houver).
+        """
+        snapshot = catalog_snapshot.load()
+        if snapshot is None:
+            return 0
+        products, index, fetched_at, revision = snapshot
+        _cache["index"] = index
+        _cache["data"] = products
+        _cache["timestamp"] = fetched_at
+        _cache["revision"] = revision
+        if time.time() - fetched_at >= CACHE_TTL:
+            self._refresh_in_background()
+        return len(products)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        reraise=True,
+    )
+    def _fetch_products(self) -> list[dict]:
+        """Lê e normaliza todas as linhas da aba de preços."""
         try:
             client = self._get_client()
             spreadsheet = client.open_by_key(settings.google_sheets_id)
@@ -83,43 +289,26 @@ class SheetsClient:
                 worksheet = spreadsheet.sheet1
 
             records = worksheet.get_all_records()
-            products = []
+            self.downloads += 1
 
+            products = []
+            parsed_rows: dict[tuple, dict | None] = {}
+            reparsed = 0
             for row in records:
-                # Normaliza chaves para busca (remove espaços extras das colunas)
-                # Ex: "PRODUTO " vira "PRODUTO"
-                row_normalized = {str(k).strip(): v for k, v in row.items()}
-
-                # Flexível: aceita variações nos nomes das colunas
-                produto = (
-                    row_normalized.get("PRODUTO") or row_normalized.get("Produto") or row_normalized.get("produto") or ""
-                ).strip()
-                unidade = (
-                    row_normalized.get("UNIDADE") or row_normalized.get("Unidade") or row_normalized.get("unidade") or "UNIDADE"
-                ).strip()
-                preco_raw = (
-                    row_normalized.get("PREÇO") or row_normalized.get("Preço") or row_normalized.get("preco") or row_normalized.get("PRECO") or "0"
-                )
-
-                if not produto:
-                    continue
-
-                # Limpa o preço: "R$ 44,13" → 44.13
-                preco_str = str(preco_raw).strip()
-                preco_str = preco_str.replace("R$", "").replace(" ", "").replace(".", "").replace(",", ".")
-                try:
-                    preco = float(preco_str)
-                except ValueError:
-                    preco = 0.0
-
-                products.append({
-                    "produto": produto,
-                    "unidade": unidade,
-                    "preco": preco,
-                })
-
-            _cache["data"] = products
-            _cache["timestamp"] = now
+                key = tuple(row.items())
+                if key in parsed_rows:
+                    product = parsed_rows[key]
+                elif key in self._parsed_rows:
+                    product = self._parsed_rows[key]
+                else:
+                    product = _parse_row(row)
+                    reparsed += 1
+                parsed_rows[key] = product
+                if product is not None:
+                    products.append(product)
+            self._parsed_rows = parsed_rows
+
+            logger.debug(f"Linhas re-processadas: {reparsed} de {len(records)}")
             logger.info(f"Planilha carregada: {len(products)} produtos")
             return products
 
@@ -131,23 +320,30 @@ class SheetsClient:
 
     def search_products(self, query: str, limit: int = 10) -> list[dict]:
         """
-        Busca produtos por nome (case insensitive, partial match).
-        Retorna os mais relevantes primeiro.
+        Busca produtos por nome no índice do catálogo.
+        Ignora acentos, caixa e plural simples, normaliza números/unidades ("0,43" = "0.43")
+        e tolera erros de digitação. Retorna os mais relevantes primeiro.
         """
-        all_products = self.get_all_products()
-        query_lower = query.lower()
-
-        # Score por relevância
-        scored = []
-        for p in all_products:
-            nome = p["produto"].lower()
-            if query_lower in nome:
-                # Score mais alto se começa com a query
-                score = 2 if nome.startswith(query_lower) else 1
-                scored.append((score, p))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [item[1] for item in scored[:limit]]
+        self.get_all_products()
+        index: ProductIndex = _cache["index"]
+        return index.search(query, limit=limit)
+
+    async def search_products_async(self, query: str, limit: int = 10) -> list[dict]:
+        """Como search_products, sem bloquear o event loop quando o catálogo precisa ser baixado."""
+        await self.get_all_products_async()
+        index: ProductIndex = _cache["index"]
+        return index.search(query, limit=limit)
+
+    def stats(self) -> dict:
+        """Métricas do catálogo: tamanho, idade, revisão e o que mudou no último refresh."""
+        return {
+            "produtos": len(_cache["data"]),
+            "idade_s": round(time.time() - _cache["timestamp"]) if _cache["timestamp"] else None,
+            "revisao": _cache["revision"],
+            "downloads": self.downloads,
+            "verificacoes_sem_mudanca": self.unchanged_checks,
+            "ultima_mudanca": self.last_changes,
+        }
 
     def invalidate_cache(self):
         """Força refresh do cache na próxima consulta."""
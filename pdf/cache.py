@@ -0,0 +1,159 @@
+"""
+Cache local de PDFs endereçado por conteúdo.
+A chave é o hash dos dados do orçamento (cliente, itens, total, validade, observações):
+re-orçamentos idênticos reaproveitam o PDF (e a URL) sem renderizar nem enviar de novo.
+Os arquivos ficam em disco (servidos por api/pdfs.py) com remoção LRU por bytes.
+PDFs cuja URL local foi gravada num orçamento são fixados ({chave}.pin) e nunca removidos.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+
+from core.config import settings
+from core.logger import logger
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PDFCache:
+    """
+    Arquivos {chave}.pdf + {chave}.json (número e URL publicada) num diretório limitado por bytes.
+    Chaves fixadas (link salvo no banco) não entram na remoção LRU.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # chave → bytes em disco, do menos para o mais recentemente usado
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._pinned: set[str] = set()
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(**quote) -> str:
+        """Hash SHA-256 da representação canônica dos dados do orçamento."""
+        canonical = json.dumps(quote, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_valid_key(key: str) -> bool:
+        return bool(_KEY_RE.match(key))
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _pin_path(self, key: str) -> Path:
+        return self.directory / f"{key}.pin"
+
+    def _load(self) -> None:
+        """Reconstrói o índice LRU a partir do disco (ordem pelo último acesso, via mtime)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        self._pinned = {path.stem for path in self.directory.glob("*.pin")}
+        if files:
+            logger.info(f"Cache de PDFs: {len(files)} arquivos, {self._bytes // 1024} KB")
+
+    def get(self, key: str) -> dict | None:
+        """Metadados do PDF em cache ({"numero", "pdf_url"}) ou None. Marca como usado."""
+        self._load()
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        try:
+            meta = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+            os.utime(self.path_for(key))
+        except (FileNotFoundError, ValueError):
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return meta
+
+    def put(self, key: str, pdf_bytes: bytes, numero: str) -> None:
+        """Grava o PDF (escrita atômica) e remove os menos usados acima do limite de bytes."""
+        self._load()
+        self._write(self.path_for(key), pdf_bytes)
+        self._write_meta(key, {"numero": numero, "pdf_url": ""})
+        self._bytes -= self._entries.pop(key, 0)
+        self._entries[key] = len(pdf_bytes)
+        self._bytes += len(pdf_bytes)
+        self._evict(keep=key)
+
+    def _evict(self, keep: str) -> None:
+        """Remove os menos usados (exceto fixados e `keep`) até caber no limite de bytes."""
+        for candidate in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if candidate == keep or candidate in self._pinned:
+                continue
+            self._remove(candidate)
+            self.evictions += 1
+
+    def pin(self, key: str) -> None:
+        """Fixa o PDF: a URL local dele foi gravada num orçamento e não pode virar 404."""
+        self._load()
+        if key in self._pinned:
+            return
+        self._pinned.add(key)
+        self._pin_path(key).touch()
+
+    def set_url(self, key: str, pdf_url: str) -> None:
+        """Registra a URL em que o PDF foi publicado (reaproveitada nos próximos hits)."""
+        try:
+            meta = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+            meta["pdf_url"] = pdf_url
+            self._write_meta(key, meta)
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug(f"Metadados do PDF {key[:12]} indisponíveis: {e}")
+
+    def _write_meta(self, key: str, meta: dict) -> None:
+        self._write(self._meta_path(key), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key, 0)
+        self._meta_path(key).unlink(missing_ok=True)
+        if key not in self._pinned:  # O arquivo de um PDF fixado continua sendo servido
+            self.path_for(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "itens": len(self._entries),
+            "fixados": len(self._pinned),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "removidos": self.evictions,
+        }
+
+
+# Instância global
+pdf_cache = PDFCache(settings.pdf_cache_dir, settings.pdf_cache_max_bytes)
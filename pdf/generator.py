@@ -1,8 +1,11 @@
 """
 Gerador de PDF usando fpdf2 — 100% Python puro, zero dependências de sistema.
 Funciona identicamente no Windows local e em qualquer VPS Linux.
+A quebra de linha dos textos fixos (termos, dados bancários, prazos) é calculada uma vez
+por processo e reaproveitada; a cada orçamento só as regiões variáveis são diagramadas.
 """
 from datetime import datetime
+from functools import lru_cache
 from io import BytesIO
 
 from fpdf import FPDF, XPos, YPos
@@ -39,6 +42,20 @@ TERMOS_GERAIS = """1. O descarregamento é feito mediante pagamento de 100% do v
 6. Entregas seguem logística de formação de carga. Atrasos logísticos/pintura não geram responsabilidade civil.
 7. O Cliente é responsável pelas medidas especificadas no pedido."""
 
+PRAZOS_ENTREGA = "Frete: A consultar\nPrazo: A consultar\nPagamento: A combinar"
+
+
+@lru_cache(maxsize=None)
+def _wrap_static(text: str, style: str, size: float, w: float, h: float) -> tuple[str, ...]:
+    """
+    Linhas de um texto fixo como o multi_cell as quebraria, calculadas uma vez por processo
+    (a medição caractere a caractere do fpdf2 é a parte mais cara do PDF).
+    """
+    pdf = OrcamentoPDF(orientation="P", unit="mm", format="A4")
+    pdf.add_page()
+    pdf.set_font("Helvetica", style, size)
+    return tuple(pdf.multi_cell(w, h, text, dry_run=True, output="LINES"))
+
 
 class OrcamentoPDF(FPDF):
     """PDF personalizado para orçamentos."""
@@ -59,6 +76,12 @@ class OrcamentoPDF(FPDF):
         if text:
             self.set_text_color(r, g, b)
 
+    def static_text(self, w: float, h: float, text: str, style: str = "", size: float = 7):
+        """Equivalente ao multi_cell para textos fixos, com a quebra de linha já calculada."""
+        self.set_font("Helvetica", style, size)
+        for line in _wrap_static(text, style, size, w, h):
+            self.cell(w, h, line, new_x=XPos.LEFT, new_y=YPos.NEXT)
+
     def label_value(self, label: str, value: str, sub: str = "", w: float = 55):
         self.set_font("Helvetica", "B", 7)
         self.set_cor(COR_CINZA, text=True)
@@ -89,7 +112,7 @@ class PDFGenerator:
         Gera o PDF do orçamento e retorna os bytes.
 
         Args:
-            numero: Número do orçamento (ex: ORC-202402191030)
+            numero: Número do orçamento (ex: ORC-20240219-A1B2C3)
             nome_cliente: Nome do cliente
             itens: Lista de itens [{produto, quantidade, unidade, preco_unitario, total}]
             valor_total: Valor total em reais
@@ -289,9 +312,8 @@ class PDFGenerator:
             pdf.cell(half_w, 4, "DADOS PARA PAGAMENTO", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
             
             pdf.set_x(MARGIN + 2)
-            pdf.set_font("Helvetica", "", 7)
             pdf.set_text_color(*COR_TEXTO)
-            pdf.multi_cell(half_w - 4, 3.5, DADOS_BANCARIOS)
+            pdf.static_text(half_w - 4, 3.5, DADOS_BANCARIOS, size=7)
 
             # Lado Direito: Prazos (simplificado)
             x_right = MARGIN + half_w + 4
@@ -306,9 +328,8 @@ class PDFGenerator:
             pdf.cell(half_w, 4, "PRAZOS E ENTREGAS", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
             pdf.set_x(x_right + 2)
-            pdf.set_font("Helvetica", "", 7)
             pdf.set_text_color(*COR_TEXTO)
-            pdf.multi_cell(half_w - 4, 3.5, "Frete: A consultar\nPrazo: A consultar\nPagamento: A combinar")
+            pdf.static_text(half_w - 4, 3.5, PRAZOS_ENTREGA, size=7)
 
             pdf.set_y(y_cond + h_banco + 3)
 
@@ -319,9 +340,8 @@ class PDFGenerator:
             pdf.set_text_color(*COR_CINZA)
             pdf.cell(eff_w, 4, "TERMOS E CONDIÇÕES DE FORNECIMENTO", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
             
-            pdf.set_font("Helvetica", "", 6)  # Fonte bem pequena para caber
             pdf.set_text_color(80, 80, 80)
-            pdf.multi_cell(eff_w, 3, TERMOS_GERAIS)
+            pdf.static_text(eff_w, 3, TERMOS_GERAIS, size=6)  # Fonte bem pequena para caber
             
             pdf.ln(3)
 
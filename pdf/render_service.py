@@ -0,0 +1,175 @@
+"""
+Serviço de renderização de PDFs em processos separados.
+O fpdf2 é CPU-bound: renderizar no event loop trava todas as conversas do worker.
+Aqui cada orçamento é renderizado num ProcessPoolExecutor com processos pré-aquecidos,
+fila limitada (excedente é recusado na hora) e timeout por renderização.
+"""
+import asyncio
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.config import settings
+from core.logger import logger
+from core.exceptions import PDFGenerationError
+
+
+def _init_worker() -> None:
+    """Inicialização de cada processo: logs só no stdout e fpdf2 já importado."""
+    from core.logger import logger as worker_logger
+    worker_logger.remove()  # O arquivo de log com rotação é do processo principal
+    worker_logger.add(sys.stdout, level="WARNING")
+    import pdf.generator  # noqa: F401
+
+
+def _warm_up() -> bool:
+    """Renderiza um PDF mínimo para carregar fontes e caches do fpdf2 no processo."""
+    from pdf.generator import pdf_generator
+    pdf_generator.generate(
+        numero="AQUECIMENTO",
+        nome_cliente="-",
+        itens=[{"produto": "-", "unidade": "-", "quantidade": 1, "preco_unitario": 0, "total": 0}],
+        valor_total=0,
+        validade="-",
+    )
+    return True
+
+
+def _render(kwargs: dict) -> tuple[bytes, float]:
+    """Executado no processo do pool: retorna (bytes do PDF, tempo de renderização em s)."""
+    from pdf.generator import pdf_generator
+    started = time.perf_counter()
+    pdf_bytes = pdf_generator.generate(**kwargs)
+    return pdf_bytes, time.perf_counter() - started
+
+
+class PDFRenderService:
+    """Fila limitada de renderizações sobre um pool de processos."""
+
+    def __init__(self):
+        self._executor: ProcessPoolExecutor | None = None
+        # Vagas = processos + fila de espera
+        self._capacity = settings.pdf_render_workers + settings.pdf_render_queue_size
+        self._in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._render_seconds = 0.0
+        self._max_render_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: o processo principal já tem threads (pool do Supabase, refresh da planilha)
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.pdf_render_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Sobe e aquece os processos do pool (chamado no startup)."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*[
+                loop.run_in_executor(executor, _warm_up) for _ in range(settings.pdf_render_workers)
+            ])
+            logger.info(
+                f"✅ PDF: {settings.pdf_render_workers} processos de renderização prontos "
+                f"em {time.perf_counter() - started:.1f}s"
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Aquecimento do pool de PDF falhou: {e}")
+
+    async def render(self, **kwargs) -> bytes:
+        """
+        Renderiza o orçamento (mesmos argumentos de PDFGenerator.generate) fora do event loop.
+        Levanta PDFGenerationError se a fila estiver cheia, se passar do timeout ou se falhar.
+        """
+        if self._in_flight >= self._capacity:
+            self.rejected += 1
+            raise PDFGenerationError("Fila de geração de PDF cheia, tente novamente em instantes")
+
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        try:
+            # A vaga só é liberada quando o processo termina de fato (mesmo após um timeout,
+            # a renderização continua ocupando o processo até acabar)
+            future = self._get_executor().submit(_render, kwargs)
+            self._in_flight += 1
+            future.add_done_callback(lambda _: self._release_slot(loop))
+            pdf_bytes, render_seconds = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=settings.pdf_render_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            # O processo termina a renderização em curso; o resultado é descartado
+            self.timeouts += 1
+            raise PDFGenerationError(
+                f"Geração do PDF excedeu {settings.pdf_render_timeout_seconds}s"
+            )
+        except PDFGenerationError:
+            self.failed += 1
+            raise
+        except BrokenProcessPool as e:
+            # Um processo morreu (ex.: OOM): descarta o pool; o próximo pedido cria outro
+            self.failed += 1
+            self._discard_executor()
+            logger.error(f"Pool de renderização de PDF quebrado, recriando: {e}")
+            raise PDFGenerationError(f"Falha na geracao do PDF: {e}")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Erro no pool de renderização de PDF: {e}")
+            raise PDFGenerationError(f"Falha na geracao do PDF: {e}")
+
+        total_seconds = time.perf_counter() - queued_at
+        self.rendered += 1
+        self._render_seconds += render_seconds
+        self._max_render_seconds = max(self._max_render_seconds, render_seconds)
+        self._wait_seconds += total_seconds - render_seconds
+        logger.info(
+            f"PDF gerado: {kwargs.get('numero')} | {len(pdf_bytes)} bytes | "
+            f"render {render_seconds * 1000:.0f} ms | espera {(total_seconds - render_seconds) * 1000:.0f} ms"
+        )
+        return pdf_bytes
+
+    def _release_slot(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Callback do future do executor (roda na thread do pool): libera a vaga no event loop."""
+        def release():
+            self._in_flight -= 1
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass  # Event loop já encerrado (shutdown)
+
+    def stats(self) -> dict:
+        rendered = self.rendered or 1
+        return {
+            "processos": settings.pdf_render_workers,
+            "em_andamento": min(self._in_flight, settings.pdf_render_workers),
+            "na_fila": max(self._in_flight - settings.pdf_render_workers, 0),
+            "gerados": self.rendered,
+            "falhas": self.failed,
+            "timeouts": self.timeouts,
+            "recusados": self.rejected,
+            "render_medio_ms": round(self._render_seconds / rendered * 1000, 1),
+            "render_max_ms": round(self._max_render_seconds * 1000, 1),
+            "espera_media_ms": round(self._wait_seconds / rendered * 1000, 1),
+        }
+
+    def _discard_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def aclose(self) -> None:
+        self._discard_executor()
+
+
+# Instância global
+pdf_render_service = PDFRenderService()
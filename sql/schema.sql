@@ -15,6 +15,14 @@ CREATE TABLE IF NOT EXISTS leads (
     nome TEXT,
     cidade TEXT,
     status TEXT DEFAULT 'novo' CHECK (status IN ('novo', 'qualificando', 'orcamento_enviado', 'negociando', 'fechado', 'perdido')),
+    -- Estado desnormalizado do último orçamento (mantido pela RPC salvar_orcamento)
+    last_orcamento_id UUID,
+    last_valor_total DECIMAL(10, 2),
+    last_pdf_url TEXT,
+    orcamentos_count INTEGER NOT NULL DEFAULT 0,
+    -- Resumo acumulado da conversa (mantido em background por agent/summarizer.py)
+    resumo TEXT,
+    resumo_ate TIMESTAMPTZ,
     criado_em TIMESTAMPTZ DEFAULT NOW(),
     atualizado_em TIMESTAMPTZ DEFAULT NOW()
 );
@@ -28,6 +36,8 @@ CREATE TABLE IF NOT EXISTS messages (
     lead_id UUID NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
     role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'tool')),
     content TEXT NOT NULL,
+    direction TEXT CHECK (direction IN ('inbound', 'outbound')),
+    status TEXT,
     criado_em TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -50,6 +60,48 @@ CREATE TABLE IF NOT EXISTS orcamentos (
     atualizado_em TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- ============================================================
+-- MIGRAÇÃO: estado de orçamento desnormalizado em leads
+-- (para bancos criados antes destas colunas existirem)
+-- ============================================================
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_orcamento_id UUID;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_valor_total DECIMAL(10, 2);
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_pdf_url TEXT;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS orcamentos_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE leads l
+SET orcamentos_count = o.total,
+    last_orcamento_id = o.ultimo_id,
+    last_valor_total = o.ultimo_valor,
+    last_pdf_url = o.ultimo_pdf
+FROM (
+    SELECT DISTINCT ON (lead_id)
+        lead_id,
+        COUNT(*) OVER (PARTITION BY lead_id) AS total,
+        id AS ultimo_id,
+        valor_total AS ultimo_valor,
+        pdf_url AS ultimo_pdf
+    FROM orcamentos
+    ORDER BY lead_id, criado_em DESC
+) o
+WHERE o.lead_id = l.id AND l.orcamentos_count = 0;
+
+-- ============================================================
+-- MIGRAÇÃO: resumo acumulado da conversa em leads
+-- (resumo_ate = criado_em da última mensagem coberta pelo resumo)
+-- ============================================================
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS resumo TEXT;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS resumo_ate TIMESTAMPTZ;
+
+-- ============================================================
+-- TABELA: webhook_mensagens
+-- (Ids de mensagens da Evolution API já processadas — idempotência)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS webhook_mensagens (
+    message_id TEXT PRIMARY KEY,
+    criado_em TIMESTAMPTZ DEFAULT NOW()
+);
+
 -- ============================================================
 -- TRIGGERS: atualiza updated_at automaticamente
 -- ============================================================
@@ -79,6 +131,166 @@ CREATE INDEX IF NOT EXISTS idx_messages_lead_id ON messages(lead_id);
 CREATE INDEX IF NOT EXISTS idx_messages_criado_em ON messages(criado_em DESC);
 CREATE INDEX IF NOT EXISTS idx_orcamentos_lead_id ON orcamentos(lead_id);
 CREATE INDEX IF NOT EXISTS idx_orcamentos_numero ON orcamentos(numero);
+CREATE INDEX IF NOT EXISTS idx_webhook_mensagens_criado_em ON webhook_mensagens(criado_em);
+CREATE INDEX IF NOT EXISTS idx_messages_lead_criado_em ON messages(lead_id, criado_em DESC);
+CREATE INDEX IF NOT EXISTS idx_leads_criado_em_id ON leads(criado_em DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_leads_status_criado_em_id ON leads(status, criado_em DESC, id DESC);
+
+-- ============================================================
+-- VIEW: leads_com_ultima_mensagem
+-- Lista de leads com a última mensagem (LATERAL usa idx_messages_lead_criado_em)
+-- ============================================================
+CREATE OR REPLACE VIEW leads_com_ultima_mensagem AS
+SELECT
+    l.id,
+    l.nome,
+    l.telefone,
+    l.status,
+    l.criado_em,
+    CASE WHEN m.criado_em IS NULL THEN NULL
+         ELSE jsonb_build_object('role', m.role, 'content', m.content, 'criado_em', m.criado_em)
+    END AS ultima_mensagem
+FROM leads l
+LEFT JOIN LATERAL (
+    SELECT role, content, criado_em
+    FROM messages
+    WHERE lead_id = l.id
+    ORDER BY criado_em DESC
+    LIMIT 1
+) m ON TRUE;
+
+-- ============================================================
+-- TABELA: leads_contagem
+-- Total de leads por status, mantido por trigger (contagem em tempo constante)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS leads_contagem (
+    status TEXT PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION atualizar_leads_contagem()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE leads_contagem SET total = total - 1 WHERE status = COALESCE(OLD.status, '');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO leads_contagem (status, total) VALUES (COALESCE(NEW.status, ''), 1)
+        ON CONFLICT (status) DO UPDATE SET total = leads_contagem.total + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_leads_contagem ON leads;
+CREATE TRIGGER trg_leads_contagem
+    AFTER INSERT OR DELETE OR UPDATE OF status ON leads
+    FOR EACH ROW
+    EXECUTE FUNCTION atualizar_leads_contagem();
+
+-- Carga inicial dos contadores
+INSERT INTO leads_contagem (status, total)
+SELECT COALESCE(status, ''), COUNT(*) FROM leads GROUP BY COALESCE(status, '')
+ON CONFLICT (status) DO UPDATE SET total = EXCLUDED.total;
+
+-- ============================================================
+-- RPC: carregar_contexto_turno
+-- Em uma única chamada: upsert do lead, grava a mensagem recebida e retorna
+-- lead (com o estado desnormalizado do último orçamento) + janela recente do histórico.
+-- ============================================================
+CREATE OR REPLACE FUNCTION carregar_contexto_turno(
+    p_telefone TEXT,
+    p_nome TEXT,
+    p_conteudo TEXT,
+    p_limite INTEGER DEFAULT 20
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_lead leads;
+    v_historico JSONB;
+BEGIN
+    INSERT INTO leads (telefone, nome)
+    VALUES (p_telefone, NULLIF(p_nome, ''))
+    ON CONFLICT (telefone) DO UPDATE
+        SET nome = COALESCE(leads.nome, EXCLUDED.nome)
+    RETURNING * INTO v_lead;
+
+    INSERT INTO messages (lead_id, role, content, direction, status)
+    VALUES (v_lead.id, 'user', p_conteudo, 'inbound', 'received');
+
+    SELECT COALESCE(
+        jsonb_agg(jsonb_build_object('role', m.role, 'content', m.content, 'criado_em', m.criado_em) ORDER BY m.criado_em),
+        '[]'::jsonb
+    )
+    INTO v_historico
+    FROM (
+        SELECT role, content, criado_em
+        FROM messages
+        WHERE lead_id = v_lead.id AND role IN ('user', 'assistant')
+        ORDER BY criado_em DESC
+        LIMIT p_limite
+    ) m;
+
+    RETURN jsonb_build_object(
+        'lead', to_jsonb(v_lead),
+        'historico', v_historico
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- RPC: salvar_orcamento
+-- Insere o orçamento e atualiza o estado desnormalizado do lead (e o status
+-- 'orcamento_enviado') na mesma transação. Retorna o orçamento criado e o lead atualizado.
+-- Idempotente pelo número (UNIQUE): repetir a chamada não duplica o orçamento nem a contagem.
+-- ============================================================
+CREATE OR REPLACE FUNCTION salvar_orcamento(
+    p_lead_id UUID,
+    p_numero TEXT,
+    p_itens JSONB,
+    p_valor_total DECIMAL,
+    p_pdf_url TEXT,
+    p_observacoes TEXT DEFAULT '',
+    p_validade_dias INTEGER DEFAULT 7
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_orcamento orcamentos;
+    v_lead leads;
+BEGIN
+    INSERT INTO orcamentos (numero, lead_id, itens, valor_total, pdf_url, status, observacoes, validade_dias)
+    VALUES (p_numero, p_lead_id, p_itens, p_valor_total, p_pdf_url, 'enviado', p_observacoes, p_validade_dias)
+    ON CONFLICT (numero) DO NOTHING
+    RETURNING * INTO v_orcamento;
+
+    -- Número já gravado (retentativa ou PDF reaproveitado): não insere nem conta de novo
+    IF NOT FOUND THEN
+        SELECT * INTO v_orcamento FROM orcamentos WHERE numero = p_numero;
+        SELECT * INTO v_lead FROM leads WHERE id = p_lead_id;
+        RETURN jsonb_build_object(
+            'orcamento', to_jsonb(v_orcamento),
+            'lead', to_jsonb(v_lead)
+        );
+    END IF;
+
+    UPDATE leads
+    SET last_orcamento_id = v_orcamento.id,
+        last_valor_total = v_orcamento.valor_total,
+        last_pdf_url = v_orcamento.pdf_url,
+        orcamentos_count = orcamentos_count + 1,
+        status = 'orcamento_enviado'
+    WHERE id = p_lead_id
+    RETURNING * INTO v_lead;
+
+    RETURN jsonb_build_object(
+        'orcamento', to_jsonb(v_orcamento),
+        'lead', to_jsonb(v_lead)
+    );
+END;
+$$ LANGUAGE plpgsql;
 
 -- ============================================================
 -- STORAGE BUCKET para PDFs